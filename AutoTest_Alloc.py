@@ -0,0 +1,102 @@
+#--------------------------------------------------------------------------
+# File: AutoTest_Alloc.py
+# Description: Allocation counting for the student programs with the
+#              AutoTest_alloc.c LD_PRELOAD shim
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# The peak RSS of a test cannot tell a BST that allocates a node per search
+# or leaks on remove from one that does not.  With --alloc,
+# AutoTest_OutputTest.py and AutoTest_GTest.py run the program under test
+# with AutoTest_alloc.so preloaded.  The shim counts allocations, frees,
+# bytes and the bytes still outstanding at exit, and writes them to a file
+# read back here.  The shim is compiled once per version of its source
+# into the AutoTest cache.
+#--------------------------------------------------------------------------
+import os
+import subprocess
+
+import AutoTest_Cache
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SHIM_SOURCE = os.path.join(AUTOTEST_DIR, 'AutoTest_alloc.c')
+SHIM_DIR = os.path.join(AutoTest_Cache.CACHE_DIR, 'alloc')
+COUNTS = ['allocations', 'frees', 'bytes', 'outstanding']
+
+
+def build_shim(shim_dir=SHIM_DIR, source=SHIM_SOURCE):
+    """
+    Compiles the shim with $CC (default cc) unless the cache already has
+    this version of it.
+
+    Returns:
+        str: The path of the shared library, or None if it could not be built.
+    """
+    digest = AutoTest_Cache.file_hash(source)
+    if digest is None:
+        return None
+    shim = os.path.join(shim_dir, f'AutoTest_alloc-{digest[:16]}.so')
+    if os.path.isfile(shim):
+        return shim
+    os.makedirs(shim_dir, exist_ok=True)
+    tmp = f'{shim}.{os.getpid()}.tmp'
+    try:
+        rc = subprocess.run([os.environ.get('CC', 'cc'), '-shared', '-fPIC', '-O2', '-o', tmp, source, '-ldl']).returncode
+    except OSError:
+        return None
+    if rc != 0:
+        return None
+    os.replace(tmp, shim)
+    return shim
+
+
+def shim_environment(shim, counts_file):
+    """
+    Returns the environment variables that load the shim into a program
+    and name the file it writes its counts to.
+    """
+    return {'LD_PRELOAD': shim, 'AUTOTEST_ALLOC_FILE': counts_file}
+
+
+def read_counts(counts_file):
+    """
+    Returns the counts a program wrote at exit, or None if it wrote none
+    (it crashed, was killed or did not load the shim).
+    """
+    counts = {}
+    try:
+        with open(counts_file, 'r') as f:
+            for line in f:
+                name, _, value = line.partition(' ')
+                counts[name] = int(value)
+    except (OSError, ValueError):
+        return None
+    return counts if all(name in counts for name in COUNTS) else None
+
+
+def add_counts(total, counts):
+    """
+    Returns the sum of two sets of counts; total may be None.
+    """
+    if total is None:
+        return dict(counts)
+    return {name: total[name] + counts[name] for name in COUNTS}
+
+
+def subtract_counts(counts, baseline):
+    """
+    Returns counts less a baseline (e.g. what the gtest framework does with
+    no test to run), or None if either is missing.
+    """
+    if counts is None or baseline is None:
+        return None
+    return {name: counts[name] - baseline[name] for name in COUNTS}
+
+
+def format_counts(counts):
+    return (f'{counts["allocations"]} allocations, {counts["frees"]} frees, {counts["bytes"]} bytes, '
+            f'{counts["outstanding"]} bytes outstanding at exit')
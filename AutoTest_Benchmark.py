@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Benchmark.py
+# Description: Python script to measure how the BST_Project main scales
+#              with the size of the movie queue
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# The 17-line AutoTest_movie_queue.txt cannot tell a BST from a list.  This
+# script generates movie queues of increasing size (random and pre-sorted
+# order), times main on load, search, add, delete and print at each size,
+# and fits the growth exponent k of time ~ size^k on a log-log scale.  An
+# exponent well above what a BST should give is flagged.  Results are
+# appended to a CSV report so a whole class can be compared in one sheet.
+#
+# Every run loads the whole queue, so a phase is timed as the difference
+# between a run of n and a run of 2n of its commands on the same queue
+# (and the load as the difference from an empty queue).  A difference
+# within the spread of the repeated runs is reported as unmeasurable, not
+# fitted.
+#
+# Like AutoTest_OutputTest.py, run it from the student source directory:
+#     ./BST_Project_AutoTest/AutoTest_Benchmark.py --sizes 1000 10000 100000
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import csv
+import math
+import random
+import time
+
+import AutoTest_OutputTest as ot
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+BENCH_DIR = 'AutoTest_benchmark'
+REPORT_FILE = 'AutoTest_benchmark.csv'
+SIZES = [10**3, 10**4, 10**5, 10**6]
+ORDERS = ['random', 'sorted']
+PHASES = ['load', 'search', 'add', 'delete', 'print']
+# commands per search/add/delete run; their time is reported per command
+OPERATIONS = 10000
+REPEAT = 3
+# a difference must exceed this many times the spread of the repeated
+# runs to be a measurement rather than noise
+NOISE_MARGIN = 1
+RUN_TIMEOUT = 60
+SEED = 2024
+
+# expected exponent k (time ~ size^k) of each phase; load and print are
+# total times, search/add/delete are per command.  A plain BST degenerates
+# to a list on sorted input, so sorted input is allowed the list exponents.
+EXPECTED_EXPONENTS = {'random': {'load': 1, 'search': 0, 'add': 0, 'delete': 0, 'print': 1},
+                      'sorted': {'load': 2, 'search': 1, 'add': 1, 'delete': 1, 'print': 1}}
+# how far above the expected exponent a fit may be before it is flagged
+EXPONENT_TOLERANCE = 0.5
+
+REPORT_FIELDS = ['submission', 'order', 'phase', 'size', 'seconds', 'status',
+                 'exponent', 'expected', 'flagged']
+
+
+def movie_title(number):
+    return f'Movie {number:08d}'
+
+
+def generate_queue(size, order):
+    """
+    Returns the titles of a generated movie queue, in file order.  Queue
+    titles are the even-numbered movies, so odd numbers are never present.
+    """
+    titles = [movie_title(2 * i) for i in range(size)]
+    if order == 'random':
+        random.Random(SEED + size).shuffle(titles)
+    return titles
+
+
+def queue_file(size, order):
+    """
+    Writes the generated queue for (size, order) into BENCH_DIR once.
+
+    Returns:
+        str: The path of the queue file.
+    """
+    path = os.path.join(BENCH_DIR, f'queue_{order}_{size}.txt')
+    if not ot.file_exists(path):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(''.join(f'{title}\n' for title in generate_queue(size, order)))
+        os.replace(tmp, path)
+    return path
+
+
+def phase_operations(phase, size, operations):
+    """
+    Returns n, the number of commands of the smaller of the two runs that
+    time a phase: one print, otherwise args.ops commands (for add and delete
+    no more than half the queue, so the larger run has distinct titles).
+    """
+    if phase == 'print':
+        return 1
+    if phase == 'search':
+        return operations
+    return min(operations, size // 2)
+
+
+def phase_commands(phase, size, operations):
+    """
+    Returns the stdin text of each command of a phase: search and delete
+    pick queued titles, add picks titles that are not in the queue.  The
+    first n commands are the same whatever the number of commands.
+    """
+    rng = random.Random(SEED + size + PHASES.index(phase))
+    if phase == 'search':
+        return [f'{ot.USER_COMMANDS["search"]}\n{movie_title(2 * i)}\n'
+                for i in rng.choices(range(size), k=operations)]
+    if phase == 'add':
+        return [f'{ot.USER_COMMANDS["add"]}\n{movie_title(2 * i + 1)}\n'
+                for i in rng.sample(range(size), operations)]
+    if phase == 'delete':
+        return [f'{ot.USER_COMMANDS["delete"]}\n{movie_title(2 * i)}\n'
+                for i in rng.sample(range(size), operations)]
+    if phase == 'print':
+        return [f'{ot.USER_COMMANDS["print"]}\n'] * operations
+    return []
+
+
+def session_input(commands):
+    return ''.join(commands) + f'{ot.USER_COMMANDS["exit"]}\n'
+
+
+def time_run(queue, test_input, args):
+    """
+    Runs EXECUTABLE on a queue file args.repeat times.
+
+    Returns:
+        tuple: (rc, seconds, spread) - the fastest wall time and how much
+        slower the slowest run was, or the rc of the first failed run.
+    """
+    times = []
+    for _ in range(args.repeat):
+        ot.stage_input_file(queue, ot.STUDENT_MOVIE_QUEUE_FILE)
+        args.test_deadline = time.monotonic() + args.timeout if args.timeout else None
+        start = time.perf_counter()
+        rc, _ = ot.run_process([ot.EXECUTABLE], args, test_input=test_input, capture=True,
+                               limits=True)
+        elapsed = time.perf_counter() - start
+        if rc != 0:
+            return rc, None, None
+        times.append(elapsed)
+    return 0, min(times), max(times) - min(times)
+
+
+def time_difference(base_queue, base_input, queue, test_input, args):
+    """
+    Times a run of base_input on base_queue and one of test_input on queue.
+
+    Returns:
+        tuple: (rc, seconds) - the difference of the fastest times, or None
+        seconds if it is within NOISE_MARGIN times the spread of the runs.
+    """
+    rc, base, base_spread = time_run(base_queue, base_input, args)
+    if rc != 0:
+        return rc, None
+    rc, more, more_spread = time_run(queue, test_input, args)
+    if rc != 0:
+        return rc, None
+    difference = more - base
+    if difference <= NOISE_MARGIN * max(base_spread, more_spread):
+        return 0, None
+    return 0, difference
+
+
+def benchmark_order(order, args):
+    """
+    Times every phase at each size of args.sizes for one queue order.  Once
+    a size fails or times out, the larger sizes are not run.
+
+    Returns:
+        list: One dict per (phase, size) with 'seconds' (None unless
+        measured) and 'status' ('ok', 'unmeasurable' or the failure).
+    """
+    rows = []
+    empty = session_input([])
+    for size in args.sizes:
+        queue = queue_file(size, order)
+        ot.report_info(f'[ BENCH    ] {order} queue of {size} titles', ot.GREEN)
+        times = {}
+        # the load is what a run takes beyond starting and exiting, each
+        # phase what n more of its commands add to a run of n
+        rc, seconds = time_difference(queue_file(0, order), empty, queue, empty, args)
+        if rc == 0 and seconds is not None:
+            times['load'] = seconds
+        for phase in PHASES[1:]:
+            if rc != 0:
+                break
+            operations = phase_operations(phase, size, args.ops)
+            if operations == 0:
+                continue
+            commands = phase_commands(phase, size, 2 * operations)
+            rc, seconds = time_difference(queue, session_input(commands[:operations]),
+                                          queue, session_input(commands), args)
+            if rc == 0 and seconds is not None:
+                # load and print are total times, the rest per command
+                times[phase] = seconds / (1 if phase == 'print' else operations)
+        status = 'ok' if rc == 0 else ot.FAILURE_CLASSES.get(rc, f'rc {rc}')
+        for phase in PHASES:
+            measured = rc == 0 and phase in times
+            rows.append({'order': order, 'phase': phase, 'size': size,
+                         'seconds': times.get(phase) if measured else None,
+                         'status': status if rc != 0 or measured else 'unmeasurable'})
+        if rc != 0:
+            ot.report_failure(f'{order} queue of {size} titles: {status}, larger sizes skipped')
+            break
+    return rows
+
+
+def growth_exponent(points):
+    """
+    Returns the least-squares slope of log(seconds) over log(size), or None
+    if there are fewer than two usable points.
+    """
+    points = [(math.log(size), math.log(seconds)) for size, seconds in points if seconds and seconds > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    if sxx == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sxx
+
+
+def fit_rows(rows):
+    """
+    Adds the fitted exponent, the expected exponent and the flag to each row.
+
+    Returns:
+        list: (order, phase, exponent, expected, flagged) for each fit.
+    """
+    fits = []
+    for order in ORDERS:
+        for phase in PHASES:
+            phase_rows = [row for row in rows if row['order'] == order and row['phase'] == phase]
+            if not phase_rows:
+                continue
+            exponent = growth_exponent([(row['size'], row['seconds']) for row in phase_rows])
+            expected = EXPECTED_EXPONENTS[order][phase]
+            flagged = exponent is not None and exponent > expected + EXPONENT_TOLERANCE
+            for row in phase_rows:
+                row.update(exponent=exponent, expected=expected, flagged=flagged)
+            fits.append((order, phase, exponent, expected, flagged))
+    return fits
+
+
+def report_fits(fits):
+    """
+    Prints the fitted exponent of each phase, flagging poor scaling.
+    """
+    print(f'{ot.BLUE}[==========]{ot.RESET}')
+    print(f'{ot.BLUE}[ SCALING  ] time ~ size^k (expected k for a BST in brackets){ot.RESET}')
+    print(f'{ot.BLUE}[----------]{ot.RESET}')
+    for order, phase, exponent, expected, flagged in fits:
+        if exponent is None:
+            ot.report_info(f'{"":<13}{order:<8} {phase:<8} k unmeasurable: differences within '
+                           f'run-to-run noise [{expected}]', ot.BLUE)
+            continue
+        text = f'{order:<8} {phase:<8} k = {exponent:.2f} [{expected}]'
+        if flagged:
+            ot.report_failure(f'{text} scales worse than a BST')
+        else:
+            ot.report_success(text)
+    return
+
+
+def write_report(rows, submission, output_file):
+    """
+    Appends one CSV row per (order, phase, size) to output_file, writing
+    the header if the file is new.
+    """
+    new = not ot.file_exists(output_file)
+    with open(output_file, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        if new:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, submission=submission))
+    return
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Measure how main scales with the size of the movie queue')
+    parser.add_argument("--sizes", type=int, nargs='+', default=SIZES,
+                        help="Queue sizes (number of titles) to run")
+    parser.add_argument("--orders", nargs='+', choices=ORDERS, default=ORDERS,
+                        help="Orders of the generated queue files")
+    parser.add_argument("--ops", type=int, default=OPERATIONS,
+                        help="Number of search/add/delete commands per run")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="Runs per measurement (at least 2); the fastest is kept and the spread is the noise")
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT,
+                        help="Time budget in seconds for each run (0 for none)")
+    parser.add_argument("-o", "--output", type=str, default=REPORT_FILE,
+                        help="CSV report, appended to if it exists")
+    parser.add_argument("--submission", type=str, default=None,
+                        help="Name of the submission in the report (default: source directory name)")
+    parser.add_argument("--memory-limit", type=int, default=ot.MEMORY_LIMIT,
+                        help="Address space limit in MB for the program (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=ot.CPU_LIMIT,
+                        help="CPU time limit in seconds for the program (0 for none)")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Verbose output")
+    parser.add_argument("-d", "--debug", action="store_true", default=False,
+                        help="Debug output")
+    return parser.parse_args(argv)
+
+
+def benchmark_main():
+    args = parse_arguments()
+    args.output = os.path.abspath(args.output)
+    args.sizes = sorted(args.sizes)
+    submission = args.submission or os.path.basename(os.getcwd())
+    if args.repeat < 2:
+        ot.report_failure('--repeat must be at least 2 to tell a measurement from noise')
+        sys.exit(2)
+
+    ot.setup(args)
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    rows = []
+    for order in args.orders:
+        rows += benchmark_order(order, args)
+    ot.stage_input_file(os.path.join(ot.DATA_DIR, ot.AUTOTEST_MOVIE_QUEUE_FILE), ot.STUDENT_MOVIE_QUEUE_FILE)
+    ot.cleanup(args)
+
+    fits = fit_rows(rows)
+    report_fits(fits)
+    write_report(rows, submission, args.output)
+    ot.report_info(f'[==========] Report written to {args.output}', ot.BLUE)
+    sys.exit(1 if any(fit[4] for fit in fits) else 0)
+
+def main():
+    benchmark_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Build.py
+# Description: Python script to build the BST_Project with a shared,
+#              offline googletest and a compile cache
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# Does the same job as AutoTest_setup.sh (copy the student sources, build
+# main and AutoTest_gtests, copy the data files into build), except:
+#  - googletest is built once into CACHE_DIR/gtest and every project links
+#    against it (no download, no per-submission gtest compile)
+#  - each target is keyed on a hash of its sources; an unchanged target is
+#    not rebuilt, and a target already built for identical sources (e.g. by
+#    another submission) is copied from CACHE_DIR/bin
+#--------------------------------------------------------------------------
+import sys
+import os
+import shutil
+import argparse
+import glob
+import hashlib
+import re
+import fcntl
+import zipfile
+import urllib.request
+
+import AutoTest_OutputTest as ot
+import AutoTest_Cache
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = AutoTest_Cache.CACHE_DIR
+
+# sources of each target, in addition to every header in the project
+BUILD_TARGETS = {'main': ['main.cpp'],
+                 'AutoTest_gtests': ['AutoTest_gtests.cpp']
+                }
+BUILD_FILES = ['CMakeLists.txt']
+
+# googletest sources used when there is no archive in the cache
+GTEST_SOURCE_DIRS = ['/usr/src/googletest']
+GTEST_PREFIX = 'gtest'
+GTEST_STAMP = 'AutoTest_gtest.stamp'
+
+
+def gtest_url():
+    """
+    Returns the googletest archive URL from CMakeLists.txt.
+    """
+    with open(os.path.join(AUTOTEST_DIR, 'CMakeLists.txt'), 'r') as f:
+        return re.search(r'URL\s+(\S+)', f.read()).group(1)
+
+
+def gtest_archive(cache_dir):
+    """
+    Returns the path of the googletest archive in the cache.
+    """
+    return os.path.join(cache_dir, os.path.basename(gtest_url()))
+
+
+def find_gtest_source(cache_dir, source=None):
+    """
+    Returns a local googletest source (directory or zip archive), or None.
+    """
+    if source:
+        return source
+    if ot.file_exists(gtest_archive(cache_dir)):
+        return gtest_archive(cache_dir)
+    for directory in GTEST_SOURCE_DIRS:
+        if ot.file_exists(os.path.join(directory, 'CMakeLists.txt')):
+            return directory
+    return None
+
+
+def extract_gtest_source(archive, cache_dir):
+    """
+    Extracts a googletest zip archive into the cache.
+
+    Returns:
+        str: The directory containing the top-level CMakeLists.txt.
+    """
+    source_dir = os.path.join(cache_dir, 'googletest-src')
+    shutil.rmtree(source_dir, ignore_errors=True)
+    with zipfile.ZipFile(archive) as z:
+        z.extractall(source_dir)
+    for top in os.listdir(source_dir):
+        if ot.file_exists(os.path.join(source_dir, top, 'CMakeLists.txt')):
+            return os.path.join(source_dir, top)
+    return source_dir
+
+
+def build_gtest(cache_dir, args, source=None, download=False):
+    """
+    Builds and installs googletest into cache_dir once; later calls (from
+    any process) reuse the installed artifact.
+
+    Args:
+        cache_dir (str): The shared cache directory.
+        args: Command-line arguments.
+        source (str, optional): A googletest source directory or zip archive.
+        download (bool, optional): Download the archive if no local source exists.
+
+    Returns:
+        str: The install prefix, or None if there is no local googletest
+        source (CMake then falls back to a system install or a download).
+    """
+    prefix = os.path.join(cache_dir, GTEST_PREFIX)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # serialize concurrent graders on one lock so gtest is only built once
+    with open(os.path.join(cache_dir, f'{GTEST_PREFIX}.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if ot.file_exists(os.path.join(prefix, GTEST_STAMP)):
+            return prefix
+
+        src = find_gtest_source(cache_dir, source)
+        if not src and download:
+            ot.report_info(f'Downloading {gtest_url()}')
+            urllib.request.urlretrieve(gtest_url(), gtest_archive(cache_dir))
+            src = gtest_archive(cache_dir)
+        if not src:
+            ot.report_info('No local googletest source, using system install or download')
+            return None
+        if zipfile.is_zipfile(src):
+            src = extract_gtest_source(src, cache_dir)
+
+        ot.report_info(f'[ COMPILE  ] googletest from {src} into {prefix}', ot.GREEN)
+        build_dir = os.path.join(cache_dir, f'{GTEST_PREFIX}-build')
+        shutil.rmtree(build_dir, ignore_errors=True)
+        for cmd in (['cmake', '-S', src, '-B', build_dir, f'-DCMAKE_INSTALL_PREFIX={prefix}',
+                     '-DCMAKE_BUILD_TYPE=Release', '-DBUILD_GMOCK=OFF', '-DINSTALL_GTEST=ON'],
+                    ['cmake', '--build', build_dir, '--parallel'],
+                    ['cmake', '--install', build_dir]):
+            rc, _ = ot.run_process(cmd, args)
+            if rc != 0:
+                ot.report_failure('googletest build failed')
+                return None
+        with open(os.path.join(prefix, GTEST_STAMP), 'w') as f:
+            f.write(src)
+    return prefix
+
+
+def sources_hash(project_dir, target, gtest_prefix):
+    """
+    Returns a hash of everything a target is built from: its sources, every
+    header, the build files and the googletest it links against.
+    """
+    files = BUILD_TARGETS[target] + BUILD_FILES
+    files += sorted(os.path.basename(h) for h in glob.glob(os.path.join(project_dir, '*.h')))
+    digest = hashlib.sha256(f'{target}\0{gtest_prefix}\0'.encode())
+    for file in files:
+        digest.update(f'{file}\0'.encode())
+        path = os.path.join(project_dir, file)
+        if ot.file_exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def read_stamp(stamp):
+    """
+    Returns the hash recorded for a built target, or None.
+    """
+    if not ot.file_exists(stamp):
+        return None
+    with open(stamp, 'r') as f:
+        return f.read()
+
+
+def install_file(src, dest):
+    """
+    Copies src to dest through a temporary file so readers never see a
+    partially written file.
+    """
+    tmp = f'{dest}.{os.getpid()}.tmp'
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
+    return
+
+
+def build_project(project_dir, cache_dir, args, gtest_prefix=None, targets=None):
+    """
+    Builds BUILD_TARGETS (or just targets) in project_dir/build, skipping
+    targets whose sources are unchanged and reusing targets from the
+    compile cache.
+
+    Returns:
+        int: 0 if every target is available, the cmake return code otherwise.
+    """
+    build_dir = os.path.join(project_dir, ot.BUILD)
+    os.makedirs(build_dir, exist_ok=True)
+
+    stale = {}
+    for target in targets or BUILD_TARGETS:
+        key = sources_hash(project_dir, target, gtest_prefix)
+        binary = os.path.join(build_dir, target)
+        stamp = f'{binary}.sha256'
+        cached = os.path.join(cache_dir, 'bin', key, target)
+        if ot.file_exists(binary) and read_stamp(stamp) == key:
+            ot.report_info(f'[ UPTODATE ] {target}', ot.GREEN)
+        elif ot.file_exists(cached):
+            ot.report_info(f'[ CACHED   ] {target}', ot.GREEN)
+            install_file(cached, binary)
+            with open(stamp, 'w') as f:
+                f.write(key)
+        else:
+            stale[target] = key
+
+    if not stale:
+        return 0
+
+    # a failed build must not leave the binary of the previous sources behind
+    for target in stale:
+        binary = os.path.join(build_dir, target)
+        for file in (binary, f'{binary}.sha256'):
+            if os.path.lexists(file):
+                os.remove(file)
+
+    configure = ['cmake', '-S', project_dir, '-B', build_dir]
+    if gtest_prefix:
+        configure.append(f'-DAUTOTEST_GTEST_ROOT={gtest_prefix}')
+    rc, _ = ot.run_process(configure, args)
+    if rc == 0:
+        rc, _ = ot.run_process(['cmake', '--build', build_dir, '--target'] + list(stale), args)
+    if rc != 0:
+        return rc
+
+    for target, key in stale.items():
+        binary = os.path.join(build_dir, target)
+        os.makedirs(os.path.join(cache_dir, 'bin', key), exist_ok=True)
+        install_file(binary, os.path.join(cache_dir, 'bin', key, target))
+        with open(f'{binary}.sha256', 'w') as f:
+            f.write(key)
+    return 0
+
+
+def setup_project(basepath, srcfiles, args, cache_dir=CACHE_DIR, gtest_prefix=None, targets=None):
+    """
+    Copies the student sources into the current (AutoTest) directory, builds
+    it and copies the data files into build, like AutoTest_setup.sh.
+
+    Args:
+        basepath (str): Directory containing the student sources.
+        srcfiles (list): Source files to copy; defaults to main.cpp and *.h.
+        args: Command-line arguments.
+        cache_dir (str, optional): The shared cache directory.
+        gtest_prefix (str, optional): A googletest install prefix from build_gtest.
+        targets (list, optional): Targets to build; defaults to BUILD_TARGETS.
+
+    Returns:
+        int: 0 if the build succeeded.
+    """
+    if not srcfiles:
+        srcfiles = ['main.cpp'] + [os.path.basename(h) for h in glob.glob(os.path.join(basepath, '*.h'))]
+
+    print(f'{ot.GREEN}[==========]{ot.RESET}')
+    print(f'{ot.GREEN}[ SETUP    ] Source directory: {basepath}{ot.RESET}')
+    print(f'{ot.GREEN}[          ] Source files: {" ".join(srcfiles)}{ot.RESET}')
+    print(f'{ot.GREEN}[----------]{ot.RESET}')
+    for file in srcfiles:
+        ot.file_copy(os.path.join(basepath, file), file)
+
+    print(f'{ot.GREEN}[==========]{ot.RESET}')
+    print(f'{ot.GREEN}[ COMPILE  ] Compiling program.{ot.RESET}')
+    print(f'{ot.GREEN}[----------]{ot.RESET}')
+    rc = build_project(os.getcwd(), cache_dir, args, gtest_prefix, targets)
+    if rc != 0:
+        ot.report_failure('Compile failed. Grade penalty to be assessed.')
+    else:
+        ot.report_success('Compile successful.')
+
+    # project specific file copies - the test data files used by AutoTest
+    ot.stage_input_file(ot.AUTOTEST_MOVIE_QUEUE_FILE, os.path.join(ot.BUILD, ot.STUDENT_MOVIE_QUEUE_FILE))
+    return rc
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Build the project against a shared googletest')
+    parser.add_argument("basepath", nargs='?', default='..',
+                        help="Directory containing the student sources")
+    parser.add_argument("srcfiles", nargs='*',
+                        help="Source files to copy (default: main.cpp and *.h)")
+    parser.add_argument("--cache", type=str, default=CACHE_DIR,
+                        help="Shared cache directory for googletest and built targets")
+    parser.add_argument("--gtest-source", type=str, default=None,
+                        help="Local googletest source directory or zip archive")
+    parser.add_argument("--download", action="store_true", default=False,
+                        help="Download googletest into the cache if no local source exists")
+    return parser.parse_args(argv)
+
+
+def build_main():
+    args = parse_arguments()
+    gtest_prefix = build_gtest(args.cache, args, args.gtest_source, args.download)
+    rc = setup_project(args.basepath, args.srcfiles, args, args.cache, gtest_prefix)
+    sys.exit(rc)
+
+def main():
+    build_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#--------------------------------------------------------------------------
+# File: AutoTest_Cache.py
+# Description: Persistent, content-addressed cache of test results
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# A result is stored under a key built from the hashes of everything that
+# determines it (the binary under test, the test definition and the
+# AutoTest_* data files), so a changed input simply misses and is never
+# served stale.  Entries are files; reading an entry refreshes its mtime and
+# the least recently used entries are evicted when the cache grows past
+# its size limit.
+#
+# stage_file() uses the same hashes to stage test input files without
+# copying them when the staged file is still pristine.
+#--------------------------------------------------------------------------
+import os
+import glob
+import hashlib
+import json
+import shutil
+import fcntl
+import time
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+CACHE_DIR = os.environ.get('AUTOTEST_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'AutoTest'))
+RESULT_CACHE_DIR = os.path.join(CACHE_DIR, 'results')
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# ioctl that clones a file's extents (Btrfs, XFS, ...), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+# a file modified this recently (ns) is hashed again on every call: a write
+# within the same timestamp tick as the stat would not change its mtime
+# (the coarsest common tick, FAT's, is 2 seconds)
+MTIME_RESOLUTION_NS = 2 * 10**9
+
+_file_hashes = {}
+
+
+def file_hash(path):
+    """
+    Returns the sha256 of a file, or None if it does not exist.  Hashes are
+    remembered per (path, mtime, size) so unchanged files are read once,
+    except for files modified within MTIME_RESOLUTION_NS of the stat, which
+    a later write could change without changing the mtime.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    memo_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if memo_key in _file_hashes:
+        return _file_hashes[memo_key]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    if st.st_mtime_ns < time.time_ns() - MTIME_RESOLUTION_NS:
+        _file_hashes[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+def data_files_hash(data_dir, pattern='AutoTest_*'):
+    """
+    Returns one hash over every AutoTest_* file in data_dir, so any change
+    to the test data, expected files or test scripts changes every key.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(data_dir, pattern))):
+        if os.path.isfile(path):
+            digest.update(f'{os.path.basename(path)}\0{file_hash(path)}\0'.encode())
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """
+    Returns the cache key for a sequence of strings, or None if any part is
+    None (e.g. the binary under test does not exist).
+    """
+    if any(part is None for part in parts):
+        return None
+    return hashlib.sha256('\0'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def entry_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], f'{key}.json')
+
+
+def cache_get(cache_dir, key):
+    """
+    Returns the cached result for key, or None on a miss.
+    """
+    path = entry_path(cache_dir, key)
+    try:
+        with open(path, 'r') as f:
+            result = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return result
+
+
+def cache_put(cache_dir, key, result, max_bytes=RESULT_CACHE_MAX_BYTES):
+    """
+    Stores a JSON-serializable result under key, then evicts the least
+    recently used entries if the cache is larger than max_bytes.
+    """
+    path = entry_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp, path)
+    cache_evict(cache_dir, max_bytes)
+    return
+
+
+def cache_evict(cache_dir, max_bytes=RESULT_CACHE_MAX_BYTES):
+    """
+    Removes the least recently used entries until the cache fits in max_bytes.
+    """
+    entries = []
+    total = 0
+    for path in glob.glob(os.path.join(cache_dir, '*', '*.json')):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime_ns, st.st_size, path))
+        total += st.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+    return
+
+
+def reflink(src, dest):
+    """
+    Creates dest as a copy-on-write clone of src; raises OSError if the
+    file system cannot clone.
+    """
+    with open(src, 'rb') as s, open(dest, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            os.remove(dest)
+            raise
+    return
+
+
+def stage_file(src, dest):
+    """
+    Makes dest hold the content of src as cheaply as possible:
+     - nothing is done if dest already has that content (the hash is only
+       recomputed when the mtime or size of dest changed, or dest was
+       modified too recently for its mtime to tell, see file_hash)
+     - otherwise dest becomes a reflink of src, or else a plain copy.
+    Either way dest is a file of its own that the program under test may
+    write without changing src or any other staged copy.  A dest that was
+    modified no longer hashes to the src content, so it is staged again.
+
+    Returns:
+        str: How dest was staged: 'pristine', 'reflink' or 'copy'.
+    """
+    digest = file_hash(src)
+    if digest is None:
+        raise FileNotFoundError(f'No such file: {src}')
+    # a hard link (e.g. left by an older AutoTest) shares writes with others
+    if os.path.isfile(dest) and os.stat(dest).st_nlink == 1 and file_hash(dest) == digest:
+        return 'pristine'
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        reflink(src, dest)
+        return 'reflink'
+    except OSError:
+        pass
+    shutil.copyfile(src, dest)
+    return 'copy'
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Client.py
+# Description: Python script to grade a BST_Project checkout on a running
+#              AutoTest_Server.py
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# Sends one grading job to the server, prints the job's log as it streams
+# back and ends with the one-line grade AutoTest_Grade.py prints.  The
+# exit status is 0 if the checkout built and passed every test.
+#
+# Like AutoTest_all.sh, run it from the student source directory:
+#     ./BST_Project_AutoTest/AutoTest_Client.py [-t test_search ...]
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import json
+import socket
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+# the client imports none of the grader, so these repeat
+# AutoTest_Server.SOCKET_PATH and AutoTest_OutputTest.NOT_FOUND_RC
+CACHE_DIR = os.environ.get('AUTOTEST_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'AutoTest'))
+SOCKET_PATH = os.path.join(CACHE_DIR, 'grader.sock')
+NOT_FOUND_RC = 127
+
+RED = '\033[31m'
+RESET = '\033[0m'
+
+
+def grade_checkout(request, socket_path, quiet=False):
+    """
+    Sends a grading request to the server and prints the streamed log.
+
+    Returns:
+        dict: The result event of the job: the result, the grade line and
+        whether the checkout built and passed every test.
+
+    Raises:
+        FileNotFoundError, ConnectionRefusedError: If no server is
+        listening on socket_path.
+        RuntimeError: If the server rejected or failed the job.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + '\n').encode())
+        with sock.makefile('r') as stream:
+            for line in stream:
+                event = json.loads(line)
+                if event['event'] == 'log':
+                    if not quiet:
+                        sys.stdout.write(event['text'])
+                        sys.stdout.flush()
+                elif event['event'] == 'result':
+                    return event
+                else:
+                    raise RuntimeError(event.get('message', 'grading failed'))
+    raise RuntimeError('The server closed the connection')
+
+
+def report_failure(msg):
+    """
+    Prints a failure message in red font, like AutoTest_OutputTest.report_failure.
+    """
+    print(f'{RED}[----------]{RESET}')
+    print(f'{RED}[  FAILED  ] {msg}{RESET}')
+    print(f'{RED}[----------]{RESET}')
+    return
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Grade a checkout on a running AutoTest_Server.py')
+    parser.add_argument("checkout", type=str, nargs='?', default='.',
+                        help="Student checkout to grade (default: current directory)")
+    parser.add_argument("-t", "--tests", nargs='+', type=str, default=None,
+                        help="Output tests to run (default: all)")
+    parser.add_argument("--gtests", nargs='+', type=str, default=None,
+                        help="Gtests to run, e.g. BSTTest.Search (default: all)")
+    parser.add_argument("--nostyle", action="store_true", default=False,
+                        help="Skip the coding style check")
+    parser.add_argument("--socket", type=str, default=SOCKET_PATH,
+                        help="Unix socket of the server")
+    parser.add_argument("-q", "--quiet", action="store_true", default=False,
+                        help="Print only the grade, not the log")
+    return parser.parse_args(argv)
+
+
+def client_main():
+    args = parse_arguments()
+    request = {'checkout': os.path.abspath(args.checkout), 'tests': args.tests,
+               'gtests': args.gtests, 'nostyle': args.nostyle}
+    try:
+        event = grade_checkout(request, args.socket, args.quiet)
+    except (FileNotFoundError, ConnectionRefusedError):
+        report_failure(f'No grading server on {args.socket} (start AutoTest_Server.py)')
+        sys.exit(NOT_FOUND_RC)
+    except RuntimeError as e:
+        report_failure(str(e))
+        sys.exit(1)
+
+    sys.stdout.write(event['grade'])
+    sys.exit(0 if event['passed'] else 1)
+
+def main():
+    client_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Fuzz.py
+# Description: Python script for randomized differential testing of the
+#              BST_Project main against a reference model
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# The output tests run one fixed scenario per command.  This script
+# generates random command sequences, batches many of them into one long
+# stdin stream per run, and checks every response, every print and the
+# final movie_queue_updated.txt against MovieQueueModel, a pure-Python
+# model of the program.  The first divergent batch is shrunk (delta
+# debugging) to a minimal command sequence that still diverges, which is
+# written out so it can be replayed with ./main < AutoTest_fuzz_failure.txt
+#
+# Like AutoTest_OutputTest.py, run it from the student source directory:
+#     ./BST_Project_AutoTest/AutoTest_Fuzz.py --sequences 2000
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import random
+import re
+import time
+
+import AutoTest_OutputTest as ot
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+SEQUENCES = 1000
+SEQUENCE_LENGTH = 20
+# sequences concatenated into one stdin stream (one program run)
+BATCH = 100
+RUN_TIMEOUT = 10
+MAX_SHRINK_RUNS = 500
+FAILURE_FILE = 'AutoTest_fuzz_failure.txt'
+
+# relative frequency of each command in generated sequences
+COMMAND_WEIGHTS = {'search': 3, 'add': 3, 'watch': 1, 'delete': 2, 'print': 1}
+# titles that are never in the initial queue
+FUZZ_TITLES = [f'Fuzz Movie {i:03d}' for i in range(30)] + ot.ADD_MOVIES + [ot.SEARCH_MOVIE_NOT_FOUND]
+
+RESPONSE_PATTERN = '|'.join(re.escape(response) for response in ot.MOVIE_RESPONSES)
+
+
+class MovieQueueModel:
+    """
+    Reference model of the movie queue program: a sorted set of titles.
+
+    Example:
+        model = MovieQueueModel(['Barbie', 'Up'])
+        model.apply('add', 'Cars')      # 'added'
+        model.apply('print')            # ['Barbie', 'Cars', 'Up']
+    """
+
+    def __init__(self, titles):
+        self.titles = set(titles)
+
+    def apply(self, user_cmd, movie=None):
+        """
+        Applies one command.
+
+        Returns:
+            str or list: The response to a movie command (an entry of
+            MOVIE_RESPONSES), or the printed titles for print.
+        """
+        if user_cmd == 'print':
+            return sorted(self.titles)
+        present = movie in self.titles
+        if user_cmd == 'search':
+            return 'found' if present else 'not found'
+        if user_cmd == 'add':
+            self.titles.add(movie)
+            return 'already present' if present else 'added'
+        if not present:
+            return 'not found'
+        self.titles.remove(movie)
+        return 'watched' if user_cmd == 'watch' else 'removed'
+
+    def updated_queue(self):
+        """
+        Returns the expected contents of STUDENT_MOVIE_QUEUE_UPDATE_FILE.
+        """
+        return ''.join(f'{title}\n' for title in sorted(self.titles))
+
+
+def initial_titles():
+    with open(os.path.join(ot.DATA_DIR, ot.AUTOTEST_MOVIE_QUEUE_FILE), 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def generate_sequence(rng, titles, length):
+    """
+    Returns a random command sequence of (user command, movie) tuples; the
+    movie is None for print.
+    """
+    commands = list(COMMAND_WEIGHTS)
+    weights = list(COMMAND_WEIGHTS.values())
+    sequence = []
+    for user_cmd in rng.choices(commands, weights, k=rng.randint(1, length)):
+        sequence.append((user_cmd, None if user_cmd == 'print' else rng.choice(titles)))
+    return sequence
+
+
+def commands_stdin(commands):
+    """
+    Returns the stdin text for a command sequence, ending with exit.
+    """
+    text = ''
+    for user_cmd, movie in commands:
+        text += f'{ot.USER_COMMANDS[user_cmd]}\n'
+        if movie is not None:
+            text += f'{movie}\n'
+    return text + f'{ot.USER_COMMANDS["exit"]}\n'
+
+
+def run_commands(commands, args):
+    """
+    Runs EXECUTABLE on a command sequence with a pristine movie queue.
+
+    Returns:
+        tuple: (rc, output, updated queue text or None)
+    """
+    ot.stage_input_file(os.path.join(ot.DATA_DIR, ot.AUTOTEST_MOVIE_QUEUE_FILE), ot.STUDENT_MOVIE_QUEUE_FILE)
+    ot.file_remove(ot.STUDENT_MOVIE_QUEUE_UPDATE_FILE)
+    args.test_deadline = time.monotonic() + args.timeout if args.timeout else None
+    rc, output = ot.run_process([ot.EXECUTABLE], args, test_input=commands_stdin(commands), capture=True,
+                                limits=True)
+    updated = None
+    if ot.file_exists(ot.STUDENT_MOVIE_QUEUE_UPDATE_FILE):
+        with open(ot.STUDENT_MOVIE_QUEUE_UPDATE_FILE, 'r', errors='replace') as f:
+            updated = f.read()
+    return rc, output, updated
+
+
+def find_divergence(commands, titles, rc, output, updated):
+    """
+    Replays a command sequence on the model and walks the program output in
+    order, looking for the first response that differs.
+
+    Returns:
+        dict: 'index' (of the command, or len(commands) for the updated
+        queue), 'expected' and 'actual', or None if the program agrees.
+    """
+    if rc != 0:
+        return {'index': len(commands), 'expected': 'rc = 0',
+                'actual': f'rc = {rc} ({ot.RC_REASONS.get(rc, "error")})'}
+    model = MovieQueueModel(titles)
+    position = 0
+    for index, (user_cmd, movie) in enumerate(commands):
+        expected = model.apply(user_cmd, movie)
+        if user_cmd == 'print':
+            if not expected:
+                continue
+            pattern = r'\s+'.join(re.escape(title) for title in expected)
+        else:
+            pattern = rf'{re.escape(movie)}\s+({RESPONSE_PATTERN})'
+        match = ot.compile_pattern(pattern).search(output, position)
+        if not match:
+            actual = output[position:position + 200].strip() or '<end of output>'
+            return {'index': index, 'expected': expected, 'actual': actual}
+        if user_cmd != 'print' and match.group(1) != expected:
+            return {'index': index, 'expected': expected, 'actual': match.group(1)}
+        position = match.end()
+
+    if updated is None:
+        return {'index': len(commands), 'expected': f'{ot.STUDENT_MOVIE_QUEUE_UPDATE_FILE} written',
+                'actual': f'{ot.STUDENT_MOVIE_QUEUE_UPDATE_FILE} not written'}
+    expected = [key for _, _, key in ot.normalize_lines(model.updated_queue())]
+    actual = [key for _, _, key in ot.normalize_lines(updated)]
+    if actual != expected:
+        missing = [title for title in expected if title not in actual]
+        extra = [title for title in actual if title not in expected]
+        return {'index': len(commands),
+                'expected': f'{ot.STUDENT_MOVIE_QUEUE_UPDATE_FILE} with {len(expected)} titles in order',
+                'actual': f'{len(actual)} titles, missing {missing}, unexpected {extra}'}
+    return None
+
+
+def check_commands(commands, titles, args):
+    """
+    Runs a command sequence and returns its divergence (see find_divergence).
+    """
+    return find_divergence(commands, titles, *run_commands(commands, args))
+
+
+def shrink(commands, titles, args):
+    """
+    Reduces a divergent command sequence by delta debugging: removes ever
+    smaller chunks of commands as long as the program still diverges.
+
+    Returns:
+        list: The smallest divergent sequence found within MAX_SHRINK_RUNS runs.
+    """
+    chunks = 2
+    runs = 0
+    while len(commands) > 1 and runs < args.max_shrink_runs:
+        size = -(-len(commands) // chunks)
+        for start in range(0, len(commands), size):
+            candidate = commands[:start] + commands[start + size:]
+            runs += 1
+            if candidate and check_commands(candidate, titles, args):
+                commands = candidate
+                chunks = max(chunks - 1, 2)
+                break
+            if runs >= args.max_shrink_runs:
+                break
+        else:
+            if chunks >= len(commands):
+                break
+            chunks = min(chunks * 2, len(commands))
+    if args.verbose:
+        ot.report_info(f'Shrinking took {runs} runs')
+    return commands
+
+
+def describe_command(command):
+    user_cmd, movie = command
+    return user_cmd if movie is None else f'{user_cmd} {movie}'
+
+
+def report_divergence(commands, divergence):
+    """
+    Prints a minimal divergent sequence and where the program left the model.
+    """
+    ot.report_failure(f'Program diverges from the model after {len(commands)} commands')
+    for index, command in enumerate(commands):
+        marker = '>>' if index == divergence['index'] else '  '
+        ot.report_info(f'{marker} {index + 1:>3}. {describe_command(command)}')
+    ot.report_info(f'Expected: {divergence["expected"]}', ot.GREEN)
+    ot.report_info(f'Actual:   {divergence["actual"]}', ot.RED)
+    return
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Differential testing of main against a reference model')
+    parser.add_argument("--sequences", type=int, default=SEQUENCES,
+                        help="Number of random command sequences")
+    parser.add_argument("--length", type=int, default=SEQUENCE_LENGTH,
+                        help="Maximum number of commands in a sequence")
+    parser.add_argument("--batch", type=int, default=BATCH,
+                        help="Sequences sent to the program in one run")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Random seed (default: random, printed so a run can be repeated)")
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT,
+                        help="Time budget in seconds for each run (0 for none)")
+    parser.add_argument("--max-shrink-runs", type=int, default=MAX_SHRINK_RUNS,
+                        help="Maximum program runs spent shrinking a failure")
+    parser.add_argument("-o", "--output", type=str, default=FAILURE_FILE,
+                        help="File for the stdin of the minimal failing sequence")
+    parser.add_argument("--memory-limit", type=int, default=ot.MEMORY_LIMIT,
+                        help="Address space limit in MB for the program (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=ot.CPU_LIMIT,
+                        help="CPU time limit in seconds for the program (0 for none)")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Verbose output")
+    parser.add_argument("-d", "--debug", action="store_true", default=False,
+                        help="Debug output")
+    return parser.parse_args(argv)
+
+
+def fuzz_main():
+    args = parse_arguments()
+    args.output = os.path.abspath(args.output)
+    if args.seed is None:
+        args.seed = random.randrange(1 << 32)
+    rng = random.Random(args.seed)
+    ot.report_info(f'[ FUZZ     ] {args.sequences} sequences, seed {args.seed}', ot.GREEN)
+
+    ot.setup(args)
+    titles = initial_titles()
+    pool = titles + [title for title in FUZZ_TITLES if title not in titles]
+
+    rc = 0
+    for start in range(0, args.sequences, args.batch):
+        commands = []
+        for _ in range(min(args.batch, args.sequences - start)):
+            commands += generate_sequence(rng, pool, args.length)
+        divergence = check_commands(commands, titles, args)
+        if divergence:
+            # nothing after the divergent command matters
+            minimal = shrink(commands[:divergence['index'] + 1], titles, args)
+            divergence = check_commands(minimal, titles, args) or divergence
+            report_divergence(minimal, divergence)
+            with open(args.output, 'w') as f:
+                f.write(commands_stdin(minimal))
+            ot.report_info(f'Replay with: {ot.EXECUTABLE} < {args.output}')
+            rc = 1
+            break
+        if args.verbose:
+            ot.report_success(f'Sequences {start + 1}-{start + args.batch}: {len(commands)} commands agree')
+    ot.stage_input_file(os.path.join(ot.DATA_DIR, ot.AUTOTEST_MOVIE_QUEUE_FILE), ot.STUDENT_MOVIE_QUEUE_FILE)
+    ot.cleanup(args)
+
+    if rc == 0:
+        ot.report_success(f'{args.sequences} sequences agree with the model')
+    sys.exit(rc)
+
+def main():
+    fuzz_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_GTest.py
+# Description: Python script to run the BST_Project gtests in shards with
+#              crash-isolated re-runs
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# AutoTest_gtest.sh runs one gtest per process, because a segfault in one
+# test hides the results of every test after it.  This script starts
+# AutoTest_gtests once per shard instead (GTEST_TOTAL_SHARDS and
+# GTEST_SHARD_INDEX, one shard per job) and reads each shard's results from
+# --gtest_output=xml.  A shard that crashes writes no XML, so the results
+# of the tests it finished are read from its output, and only the tests
+# that did not report are re-run, split in halves until the crashing test
+# is on its own and can be given the 139/134 of its crash.
+#
+# With --alloc, each test is also run on its own process under the
+# allocation-counting shim (see AutoTest_Alloc.py), less a run with no
+# tests that counts what the gtest framework itself allocates and frees.
+#
+# Like AutoTest_gtest.sh, run it from the student source directory:
+#     ./BST_Project_AutoTest/AutoTest_GTest.py [BSTTest.Search ...]
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import re
+import tempfile
+import time
+import concurrent.futures
+import xml.etree.ElementTree as ET
+
+import AutoTest_OutputTest as ot
+import AutoTest_Alloc
+import AutoTest_Results
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+GTEST_SOURCE = os.path.join(AUTOTEST_DIR, 'AutoTest_gtests.cpp')
+GTEST_EXECUTABLE = os.path.join(AUTOTEST_DIR, ot.BUILD, 'AutoTest_gtests')
+GTEST_TIMEOUT = 30
+
+# gtest's line for a finished test, e.g. "[       OK ] BSTTest.Empty (0 ms)"
+FINISHED_TEST = re.compile(r'^\[ +(OK|FAILED) +\] (\S+) \(\d+ ms\)', re.MULTILINE)
+SHARD_VARIABLES = ('GTEST_TOTAL_SHARDS', 'GTEST_SHARD_INDEX')
+
+
+def source_tests(source=GTEST_SOURCE):
+    """
+    Returns the names (Suite.Test) of the TEST()s in the gtest source, in
+    source order; these are the tests every submission is graded on.
+    """
+    with open(source, 'r') as f:
+        return [f'{suite}.{test}' for suite, test in
+                re.findall(r'^\s*TEST(?:_F)?\(\s*(\w+)\s*,\s*(\w+)\s*\)', f.read(), re.MULTILINE)]
+
+
+def list_tests(binary, args):
+    """
+    Returns the names of the tests in a gtest binary, in the order gtest
+    runs (and shards) them, or None if the binary cannot list them.
+    """
+    rc, output = ot.run_process([binary, '--gtest_list_tests'], args, capture=True,
+                                env=dict.fromkeys(SHARD_VARIABLES))
+    if rc != 0:
+        return None
+    tests = []
+    suite = None
+    for line in output.splitlines():
+        if not line.strip() or line.startswith('Running main()'):
+            continue
+        name = line.split('#')[0].strip()
+        if not line.startswith(' '):
+            suite = name
+        else:
+            tests.append(f'{suite}{name}')
+    return tests
+
+
+def shard_tests(tests, total, index):
+    """
+    Returns the tests gtest runs in shard index of total: every total-th
+    test starting at index.
+    """
+    return tests[index::total]
+
+
+def read_xml_results(xml_file):
+    """
+    Returns {test name: result record} for the tests in a gtest XML report,
+    or None if there is no report (the run crashed or timed out).
+    """
+    try:
+        root = ET.parse(xml_file).getroot()
+    except (OSError, ET.ParseError):
+        return None
+    results = {}
+    for testcase in root.iter('testcase'):
+        name = f'{testcase.get("classname")}.{testcase.get("name")}'
+        result = ot.new_result(name)
+        failures = [failure.get('message', '') for failure in testcase.iter('failure')]
+        result['rc'] = 1 if failures else 0
+        result['duration'] = float(testcase.get('time', 0))
+        if failures:
+            result['failure'] = 'gtest failure'
+            result['message'] = failures[0].splitlines()[0] if failures[0] else 'failed'
+            result['mismatch'] = failures[0].splitlines()[:ot.MISMATCH_LINES]
+        results[name] = result
+    return results
+
+
+def read_output_results(output):
+    """
+    Returns {test name: result record} for the tests a run finished, read
+    from gtest's output (used when a crashed run wrote no XML).
+    """
+    results = {}
+    for status, name in FINISHED_TEST.findall(output):
+        result = ot.new_result(name)
+        result['rc'] = 0 if status == 'OK' else 1
+        if result['rc']:
+            result['failure'] = 'gtest failure'
+            result['message'] = 'failed'
+        results[name] = result
+    return results
+
+
+def run_binary(binary, tests, args, env=None):
+    """
+    Runs a gtest binary once on a list of tests (a --gtest_filter), or on
+    one shard of them if env sets GTEST_TOTAL_SHARDS/GTEST_SHARD_INDEX:
+    gtest shards the tests that pass the filter.
+
+    Returns:
+        tuple: (rc, output, results of the tests that reported, resource usage)
+    """
+    run_args = argparse.Namespace(**vars(args))
+    run_args.test_result = ot.new_result(binary)
+    run_args.test_deadline = time.monotonic() + args.timeout if args.timeout else None
+    run_args.verbose = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_file = os.path.join(tmp, 'results.xml')
+        cmd = [binary, f'--gtest_output=xml:{xml_file}', f'--gtest_filter={":".join(tests)}']
+        rc, output = ot.run_process(cmd, run_args, capture=True, limits=True,
+                                    env=env or dict.fromkeys(SHARD_VARIABLES))
+        results = read_xml_results(xml_file)
+    if results is None:
+        results = read_output_results(output)
+    return rc, output, results, run_args.test_result['usage']
+
+
+def isolate(binary, tests, args, usages):
+    """
+    Re-runs tests that did not report because their run crashed, halving
+    the set until each crash is down to one test.  A test is only given
+    the rc of a crash after it crashed in a run of its own.
+
+    Returns:
+        dict: {test name: result record} for every test in tests.
+    """
+    results = {}
+    middle = len(tests) // 2
+    for half in ((tests,) if len(tests) == 1 else (tests[:middle], tests[middle:])):
+        half_rc, _, half_results, usage = run_binary(binary, half, args)
+        usages.append(usage)
+        results.update((name, result) for name, result in half_results.items() if name in half)
+        unreported = [test for test in half if test not in results]
+        if not unreported:
+            continue
+        if len(half) > 1:
+            results.update(isolate(binary, unreported, args, usages))
+            continue
+        rc = half_rc or 1
+        result = ot.new_result(half[0])
+        result['rc'] = rc
+        result['failure'] = ot.FAILURE_CLASSES.get(rc, 'rc')
+        result['message'] = f'rc = {half_rc}' if half_rc else 'exited without reporting a result'
+        results[half[0]] = result
+    return results
+
+
+def run_shard(binary, tests, total, index, args):
+    """
+    Runs one shard and isolates any tests its crash kept from reporting.
+
+    Returns:
+        tuple: ({test name: result record} for the shard's tests, resource usages)
+    """
+    usages = []
+    planned = shard_tests(tests, total, index)
+    env = {'GTEST_TOTAL_SHARDS': str(total), 'GTEST_SHARD_INDEX': str(index)}
+    # gtest shards the filtered tests the way shard_tests() does
+    rc, output, results, usage = run_binary(binary, tests, args, env)
+    usages.append(usage)
+    results = {name: result for name, result in results.items() if name in planned}
+    unreported = [test for test in planned if test not in results]
+    if unreported:
+        if args.verbose:
+            ot.report_info(f'[ ISOLATE  ] shard {index}: rc {rc}, re-running {len(unreported)} unreported tests')
+        results.update(isolate(binary, unreported, args, usages))
+    return results, usages
+
+
+def run_gtests(binary, args, selected=None):
+    """
+    Runs the tests of a gtest binary in args.jobs shards.
+
+    Args:
+        binary (str): Path of the gtest binary.
+        args: Command-line arguments (jobs, timeout, verbose).
+        selected (list, optional): Test names to run. Defaults to every test.
+
+    Returns:
+        tuple: (result records in gtest order, resource usage of every run)
+        - the records are empty if the binary cannot list its tests.
+    """
+    tests = list_tests(binary, args)
+    if tests is None:
+        return [], []
+    if selected:
+        tests = [test for test in tests if test in selected]
+    total = max(1, min(args.jobs, len(tests)))
+
+    results = {}
+    usages = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=total) as pool:
+        futures = [pool.submit(run_shard, binary, tests, total, index, args) for index in range(total)]
+        for future in futures:
+            shard_results, shard_usages = future.result()
+            results.update(shard_results)
+            usages += shard_usages
+    return [results[test] for test in tests], usages
+
+
+def count_allocations(binary, test_filter, shim, args):
+    """
+    Runs the tests of a --gtest_filter on their own under the shim.
+
+    Returns:
+        dict: The allocation counts of the run, or None if it crashed.
+    """
+    run_args = argparse.Namespace(**vars(args))
+    run_args.test_result = ot.new_result(binary)
+    run_args.test_deadline = time.monotonic() + args.timeout if args.timeout else None
+    run_args.verbose = False
+    run_args.alloc_shim = shim
+    ot.run_process([binary, f'--gtest_filter={test_filter}'], run_args, capture=True, limits=True,
+                   env=dict.fromkeys(SHARD_VARIABLES))
+    return run_args.test_result['alloc']
+
+
+def record_allocations(binary, results, shim, args):
+    """
+    Adds the allocation counts of each test to its result record: those of
+    a run of the test alone less those of a run of no test ('-*'), i.e.
+    what gtest allocates before main and frees at exit.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        framework = pool.submit(count_allocations, binary, '-*', shim, args)
+        futures = [pool.submit(count_allocations, binary, result['name'], shim, args) for result in results]
+        for result, future in zip(results, futures):
+            result['alloc'] = AutoTest_Alloc.subtract_counts(future.result(), framework.result())
+    return
+
+
+def report_results(results, args):
+    """
+    Prints one line per test and a one-line summary.
+    """
+    for result in results:
+        alloc = f' ({AutoTest_Alloc.format_counts(result["alloc"])})' if result.get('alloc') else ''
+        if result['rc'] == 0:
+            if args.verbose or alloc:
+                ot.report_info(f'[       OK ] {result["name"]}{alloc}',
+                               ot.RED if result.get('alloc') and result['alloc']['outstanding'] > 0 else ot.GREEN)
+        elif result['rc'] in ot.RC_REASONS:
+            ot.report_info(f'[  FAILED  ] {result["name"]}: ({ot.RC_REASONS[result["rc"]]}){alloc}', ot.RED)
+        else:
+            ot.report_info(f'[  FAILED  ] {result["name"]}: {result["message"]}{alloc}', ot.RED)
+    passed = sum(1 for result in results if result['rc'] == 0)
+    color = ot.GREEN if results and passed == len(results) else ot.RED
+    ot.report_info(f'[==========] {passed}/{len(results)} gtests passed, '
+                   f'{len(results) - passed} failed', color)
+    counted = [result['alloc'] for result in results if result.get('alloc')]
+    if counted:
+        leaking = sum(1 for alloc in counted if alloc['outstanding'] > 0)
+        ot.report_info(f'[==========] {sum(alloc["allocations"] for alloc in counted)} allocations, '
+                       f'{leaking} of {len(counted)} gtests left memory allocated at exit',
+                       ot.RED if leaking else color)
+    return
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Run the gtests in shards, isolating crashes')
+    parser.add_argument("tests", nargs='*',
+                        help="Tests to run, e.g. BSTTest.Search (default: all)")
+    parser.add_argument("--binary", type=str, default=GTEST_EXECUTABLE,
+                        help="The gtest executable")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of shards run concurrently")
+    parser.add_argument("--timeout", type=float, default=GTEST_TIMEOUT,
+                        help="Time budget in seconds for each run of the binary (0 for none)")
+    parser.add_argument("--memory-limit", type=int, default=ot.MEMORY_LIMIT,
+                        help="Address space limit in MB for the binary (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=ot.CPU_LIMIT,
+                        help="CPU time limit in seconds for the binary (0 for none)")
+    parser.add_argument("--alloc", action="store_true", default=False,
+                        help="Also count the allocations of each test, run on its own (see AutoTest_Alloc.py)")
+    parser.add_argument("--results-db", type=str, default=AutoTest_Results.RESULTS_DB,
+                        help="Append the test results to this SQLite database (see AutoTest_Results.py)")
+    parser.add_argument("--no-results-db", dest="results_db", action="store_const", const=None,
+                        help="Do not record the test results")
+    parser.add_argument("--submission", type=str, default=None,
+                        help="Submission name recorded with the results (default: the current directory name)")
+    parser.add_argument("--json", type=str, default=None,
+                        help="Write the test results to this JSON file")
+    parser.add_argument("--junit", type=str, default=None,
+                        help="Write the test results to this JUnit XML file")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Verbose output")
+    parser.add_argument("-d", "--debug", action="store_true", default=False,
+                        help="Debug output")
+    return parser.parse_args(argv)
+
+
+def gtest_main():
+    args = parse_arguments()
+    results, _ = run_gtests(args.binary, args, args.tests)
+    if not results:
+        ot.report_failure(f'Unable to list the tests in {args.binary}')
+        sys.exit(ot.NOT_FOUND_RC)
+    if args.alloc:
+        shim = AutoTest_Alloc.build_shim()
+        if not shim:
+            ot.report_failure(f'Unable to build {AutoTest_Alloc.SHIM_SOURCE}')
+            sys.exit(ot.NOT_FOUND_RC)
+        record_allocations(args.binary, results, shim, args)
+
+    report_results(results, args)
+    rc = ot.combined_rc([result['rc'] for result in results])
+    if args.json:
+        ot.write_json_results(results, rc, args.json)
+    if args.junit:
+        ot.write_junit_results(results, args.junit)
+    if args.results_db:
+        submission = args.submission or os.path.basename(os.getcwd())
+        if not AutoTest_Results.record_results(args.results_db, submission, AutoTest_Results.git_commit('.'),
+                                               'gtest', results):
+            ot.report_failure(f'Unable to record the results in {args.results_db}')
+    sys.exit(rc)
+
+def main():
+    gtest_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Grade.py
+# Description: Python script to grade a directory of BST_Project submissions
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# Each subdirectory of the submissions directory that contains main.cpp is
+# one student checkout.  Every submission is copied into its own work tree
+# (student sources + a copy of this AutoTest directory), then built against
+# the shared googletest and compile cache (AutoTest_Build.py), style
+# checked, output tested and unit tested the same way AutoTest_all.sh does.
+# Submissions are graded concurrently on a process pool and the results are
+# collected into one roll-up.
+#--------------------------------------------------------------------------
+import sys
+import os
+import shutil
+import argparse
+import csv
+import traceback
+import concurrent.futures
+
+import AutoTest_OutputTest as ot
+import AutoTest_Build as build
+import AutoTest_Cache
+import AutoTest_GTest as gtest_runner
+import AutoTest_Results
+import AutoTest_Style as style
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+GTEST_EXECUTABLE = os.path.join(ot.BUILD, 'AutoTest_gtests')
+SOURCE_FILES = ['main.cpp', 'BST.h']
+
+WORK_DIR = 'AutoTest_grading'
+GRADE_LOG_FILE = 'AutoTest_grade.log'
+ROLLUP_FILE = 'AutoTest_grades.csv'
+
+IGNORE = shutil.ignore_patterns('.git', ot.BUILD, ot.PROJECT, ot.SANDBOX_DIR, WORK_DIR)
+
+
+def find_submissions(directory):
+    """
+    Returns the paths of the student checkouts in a directory, sorted by name.
+    """
+    submissions = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(os.path.join(path, SOURCE_FILES[0])):
+            submissions.append(os.path.abspath(path))
+    return submissions
+
+
+def stage_submission(submission, work_dir):
+    """
+    Creates an isolated work tree for a submission: a copy of the student
+    checkout with a copy of the AutoTest directory in it.
+
+    Returns:
+        str: Path of the staged submission.
+    """
+    staged = os.path.join(work_dir, os.path.basename(submission))
+    shutil.rmtree(staged, ignore_errors=True)
+    shutil.copytree(submission, staged, symlinks=True, ignore=IGNORE)
+    shutil.copytree(AUTOTEST_DIR, os.path.join(staged, ot.PROJECT), symlinks=True, ignore=IGNORE)
+    return staged
+
+
+def run_output_tests(tests, args, usages, records=None):
+    """
+    Runs the output tests between the setup() and cleanup() hooks, starting
+    in the submission directory.  The resource usage of each test is
+    appended to usages, and its result record to records if given.
+
+    Returns:
+        dict: The return code of each test.
+    """
+    results = {}
+    # program runs shared by these tests only, not by later submissions
+    args.run_results = {}
+    try:
+        ot.setup(args)
+    except SystemExit:
+        return {test: 1 for test in tests}
+    for test in tests:
+        results[test] = ot.run_test(test, args)
+        usages.append(args.test_result['usage'])
+        if records is not None:
+            records.append(args.test_result)
+    ot.cleanup(args)
+    return results
+
+
+def run_gtests(gtests, args, usages, records=None):
+    """
+    Runs the gtests with AutoTest_GTest.py (one shard per job, crashes
+    isolated), starting in the submission directory.  The resource usage
+    of each run of the binary is appended to usages, and the result record
+    of each gtest to records if given.
+
+    Returns:
+        dict: The return code of each gtest; NOT_FOUND_RC if the binary
+        did not report it (e.g. it was not built).
+    """
+    binary = os.path.join(ot.PROJECT, GTEST_EXECUTABLE)
+    key = None
+    if args.result_cache:
+        key = AutoTest_Cache.cache_key(GTEST_EXECUTABLE, ' '.join(gtests), AutoTest_Cache.file_hash(binary),
+                                       AutoTest_Cache.data_files_hash(ot.PROJECT))
+    cached = AutoTest_Cache.cache_get(args.result_cache, key) if key else None
+    if cached:
+        run_records, run_usages = cached['results'], cached['usages']
+    else:
+        run_records, run_usages = gtest_runner.run_gtests(binary, args, gtests)
+        if key and run_records and all(record['rc'] != ot.TIMEOUT_RC for record in run_records):
+            AutoTest_Cache.cache_put(args.result_cache, key, {'results': run_records, 'usages': run_usages})
+    gtest_runner.report_results(run_records, args)
+    usages += run_usages
+    if records is not None:
+        records += run_records
+    rcs = {record['name']: record['rc'] for record in run_records}
+    return {gtest: rcs.get(gtest, ot.NOT_FOUND_RC) for gtest in gtests}
+
+
+def skipped_tests(tests):
+    """
+    Returns the results of tests that were not run because the build
+    failed: each one failed as NOT_FOUND_RC (no program to test).
+    """
+    return {test: ot.NOT_FOUND_RC for test in tests}
+
+
+def grade_submission(submission, args):
+    """
+    Stages, builds and tests one submission, writing everything it prints
+    to GRADE_LOG_FILE in the staged submission.
+
+    Returns:
+        dict: The results for the submission.
+    """
+    staged = stage_submission(submission, args.workdir)
+    test_args = ot.parse_arguments(['--timeout', str(args.timeout), '--memory-limit', str(args.memory_limit),
+                                    '--cpu-limit', str(args.cpu_limit)])
+    test_args.run_deadline = None
+    test_args.result_cache = args.result_cache
+    # submissions already run in parallel, so each lints its files in-process
+    style_args = style.parse_arguments(['--jobs', '1'])
+    style_args.style_cache = style.STYLE_CACHE_DIR if args.result_cache else None
+    result = {'submission': os.path.basename(submission), 'log': os.path.join(staged, GRADE_LOG_FILE),
+              'usage': []}
+    output_records = []
+    gtest_records = []
+
+    with ot.capture_output(result['log']):
+        os.chdir(os.path.join(staged, ot.PROJECT))
+        result['build'] = build.setup_project('..', None, test_args, args.cache, args.gtest_prefix)
+        if args.nostyle:
+            result['style'] = None
+        else:
+            result['style'] = style.check_style('.', SOURCE_FILES, style_args)
+
+        os.chdir(staged)
+        if result['build'] != 0:
+            ot.report_failure('Build failed: the output tests and gtests were not run')
+            result['tests'] = skipped_tests(args.tests)
+            result['gtests'] = skipped_tests(args.gtests)
+        else:
+            result['tests'] = run_output_tests(args.tests, test_args, result['usage'], output_records)
+            os.chdir(staged)
+            result['gtests'] = run_gtests(args.gtests, test_args, result['usage'], gtest_records)
+        if args.results_db:
+            commit = AutoTest_Results.git_commit(submission)
+            for kind, records in (('output', output_records), ('gtest', gtest_records)):
+                if records and not AutoTest_Results.record_results(args.results_db, result['submission'],
+                                                                   commit, kind, records):
+                    ot.report_failure(f'Unable to record the results in {args.results_db}')
+
+    os.chdir(args.workdir)
+    return result
+
+
+def failed_result(submission, args, error):
+    """
+    Returns the results of a submission whose grading raised an exception:
+    the build and every test failed with rc 1, and the traceback is written
+    to its log.
+    """
+    log_dir = os.path.join(args.workdir, os.path.basename(submission))
+    os.makedirs(log_dir, exist_ok=True)
+    result = {'submission': os.path.basename(submission), 'log': os.path.join(log_dir, GRADE_LOG_FILE),
+              'usage': [], 'build': 1, 'style': None,
+              'tests': {test: 1 for test in args.tests}, 'gtests': {gtest: 1 for gtest in args.gtests}}
+    with open(result['log'], 'a') as f:
+        f.write('Grading failed with an exception:\n')
+        f.write(''.join(traceback.format_exception(error)))
+    return result
+
+
+def count_passed(result):
+    """
+    Returns (passed, total) over the output tests and gtests of a result.
+    """
+    rcs = list(result['tests'].values()) + list(result['gtests'].values())
+    return sum(1 for rc in rcs if rc == 0), len(rcs)
+
+
+def total_usage(result):
+    """
+    Returns (peak RSS in KB, CPU seconds) over every measured test of a
+    result, or (None, None) if none was measured.  A peak RSS at or below
+    the grader's own is an upper bound (see AutoTest_OutputTest.reap_process).
+    """
+    measured = [usage for usage in result['usage'] if usage]
+    if not measured:
+        return None, None
+    return (max(usage['max_rss_kb'] for usage in measured),
+            round(sum(usage['user'] + usage['sys'] for usage in measured), 3))
+
+
+def grade_line(result):
+    """
+    Returns the one-line grade of a submission and its color: green if it
+    built and passed every test.
+    """
+    passed, total = count_passed(result)
+    measured = [usage for usage in result['usage'] if usage]
+    color = ot.GREEN if passed == total and result['build'] == 0 else ot.RED
+    style = '-' if result['style'] is None else result['style']
+    return (f'[ GRADED   ] {result["submission"]}: build rc {result["build"]}, '
+            f'style rc {style}, {passed}/{total} tests passed, '
+            f'peak RSS {ot.format_rss(max(measured, key=lambda u: u["max_rss_kb"])) if measured else "-"}',
+            color)
+
+
+def report_result(result, args):
+    """
+    Prints the one-line grade of a submission, and its log if verbose.
+    """
+    ot.report_info(*grade_line(result))
+    if args.verbose:
+        ot.file_print(result['log'])
+    return
+
+
+def write_rollup(results, tests, gtests, output_file):
+    """
+    Writes one CSV row per submission with the rc of every stage and test.
+    """
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['submission', 'build', 'style'] + tests + gtests +
+                        ['passed', 'total', 'peak_rss_kb', 'cpu_seconds'])
+        for result in results:
+            row = [result['submission'], result['build'], result['style']]
+            row += [result['tests'][test] for test in tests]
+            row += [result['gtests'][gtest] for gtest in gtests]
+            row += list(count_passed(result)) + list(total_usage(result))
+            writer.writerow(row)
+    return
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Grade a directory of student submissions')
+    parser.add_argument("submissions", type=str,
+                        help="Directory containing one student checkout per subdirectory")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of submissions to grade concurrently")
+    parser.add_argument("-w", "--workdir", type=str, default=WORK_DIR,
+                        help="Directory for the isolated per-submission work trees")
+    parser.add_argument("-o", "--output", type=str, default=ROLLUP_FILE,
+                        help="CSV file for the roll-up of all results")
+    parser.add_argument("--cache", type=str, default=build.CACHE_DIR,
+                        help="Shared cache directory for googletest and built targets")
+    parser.add_argument("--timeout", type=float, default=ot.TIMEOUT,
+                        help="Time budget in seconds for each test (0 for none)")
+    parser.add_argument("--result-cache", type=str, default=AutoTest_Cache.RESULT_CACHE_DIR,
+                        help="Directory of cached test results")
+    parser.add_argument("--no-result-cache", dest="result_cache", action="store_const", const=None,
+                        help="Run every test even if a cached result exists")
+    parser.add_argument("--results-db", type=str, default=AutoTest_Results.RESULTS_DB,
+                        help="Append the test results to this SQLite database (see AutoTest_Results.py)")
+    parser.add_argument("--no-results-db", dest="results_db", action="store_const", const=None,
+                        help="Do not record the test results")
+    parser.add_argument("--memory-limit", type=int, default=ot.MEMORY_LIMIT,
+                        help="Address space limit in MB for each student program (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=ot.CPU_LIMIT,
+                        help="CPU time limit in seconds for each student program (0 for none)")
+    parser.add_argument("-t", "--tests", nargs='+', type=str, default=ot.TEST_CASES,
+                        help=f"Output tests to run (default: {ot.TEST_CASES})")
+    parser.add_argument("--gtests", nargs='+', type=str, default=None,
+                        help="Gtests to run, e.g. BSTTest.Search (default: every TEST in AutoTest_gtests.cpp)")
+    parser.add_argument("--nostyle", action="store_true", default=False,
+                        help="Skip the coding style check")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Print the full log of each submission")
+    return parser.parse_args(argv)
+
+
+def grade_main():
+    args = parse_arguments()
+    args.workdir = os.path.abspath(args.workdir)
+    args.results_db = args.results_db and os.path.abspath(args.results_db)
+    args.gtests = args.gtests or gtest_runner.source_tests()
+    args.gtest_prefix = build.build_gtest(args.cache, args)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    submissions = find_submissions(args.submissions)
+    if not submissions:
+        ot.report_failure(f'No submissions found in {args.submissions}')
+        sys.exit(1)
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(grade_submission, submission, args) for submission in submissions]
+        for submission, future in zip(submissions, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = failed_result(submission, args, e)
+            report_result(result, args)
+            results.append(result)
+
+    write_rollup(results, args.tests, args.gtests, args.output)
+    graded = sum(1 for result in results if count_passed(result)[0] == count_passed(result)[1])
+    ot.report_info(f'[==========] {graded}/{len(results)} submissions passed all tests, '
+                   f'roll-up written to {args.output}', ot.BLUE)
+    sys.exit(0)
+
+def main():
+    grade_main()
+
+if __name__ == "__main__":
+    main()
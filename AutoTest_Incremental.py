@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Incremental.py
+# Description: Python script to regrade a BST_Project checkout incrementally,
+#              re-running only the stages a git diff affects
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# AutoTest_all.sh re-runs every stage on every push.  This script remembers
+# the commit it last graded a checkout at (and that grade) in the AutoTest
+# cache, diffs the checkout against that commit and maps the changed files
+# to stages:
+#  - style: re-run if any of SOURCE_FILES changed in any way
+#  - main / AutoTest_gtests: rebuilt (and their output tests / gtests re-run)
+#    only if the code of one of their sources changed; a change to comments
+#    or formatting alone cannot change the program.  Preprocessor lines are
+#    compared as text, since their spacing can matter (#define F (x)).
+# Every other stage reuses the remembered result.  A change to the AutoTest
+# suite itself, a failed build or a commit that cannot be diffed against
+# regrades everything.
+#
+# The cache has to persist between runs (e.g. a grading machine that pulls
+# each push, see $AUTOTEST_CACHE), otherwise every run is a full grade.
+# Like AutoTest_all.sh, run it from the student source directory:
+#     ./BST_Project_AutoTest/AutoTest_Incremental.py
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import re
+
+import AutoTest_OutputTest as ot
+import AutoTest_Build as build
+import AutoTest_Cache
+import AutoTest_GTest as gtest_runner
+import AutoTest_Grade as grade
+import AutoTest_Style as style
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR = os.path.join(AutoTest_Cache.CACHE_DIR, 'incremental')
+
+# the stages (besides style) that depend on each build target
+TARGET_STAGES = {'main': 'tests', 'AutoTest_gtests': 'gtests'}
+
+# C++ tokens: preprocessor lines (with their continuations), string and
+# character literals, comments, words, multi-character operators (longest
+# first, so a - -b and a--b differ) and single punctuation characters
+CPP_TOKEN = re.compile(r'^[ \t]*#(?:\\\n|[^\n])*|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*.*?\*/|'
+                       r'\w+|<=>|<<=|>>=|->\*|\.\.\.|::|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||'
+                       r'[-+*/%&|^]=|\.\*|##|\S', re.DOTALL | re.MULTILINE)
+
+
+def git(checkout, git_args, args):
+    """
+    Runs a git command in the checkout.
+
+    Returns:
+        str: The output of the command, or None if it failed.
+    """
+    rc, output = ot.run_process(['git', '-C', checkout] + git_args, args, capture=True)
+    return output if rc == 0 else None
+
+
+def changed_files(checkout, commit, args):
+    """
+    Returns the files of the checkout that differ from commit (committed,
+    staged, modified or untracked), or None if commit cannot be diffed.
+    """
+    diff = git(checkout, ['diff', '--name-only', commit, '--'], args)
+    untracked = git(checkout, ['ls-files', '--others', '--exclude-standard'], args)
+    if diff is None or untracked is None:
+        return None
+    return sorted(set(diff.split()) | set(untracked.split()))
+
+
+def dirty_files(checkout, head, args):
+    """
+    Returns {file: content hash} for the files that differ from head, i.e.
+    the uncommitted changes a grade was given for.
+    """
+    return {file: AutoTest_Cache.file_hash(os.path.join(checkout, file))
+            for file in changed_files(checkout, head, args) or []}
+
+
+def code_tokens(text):
+    """
+    Returns the tokens of C++ source text without its comments, so two
+    texts differing only in comments or formatting have the same tokens.
+    A preprocessor line is one token, its text without surrounding spaces.
+    """
+    return [token.strip() for token in CPP_TOKEN.findall(text) if not token.startswith(('//', '/*'))]
+
+
+def code_changed(checkout, file, commit, args):
+    """
+    Returns True unless the file exists both in commit and in the checkout
+    and only its comments or formatting differ.
+    """
+    old = git(checkout, ['show', f'{commit}:{file}'], args)
+    path = os.path.join(checkout, file)
+    if old is None or not ot.file_exists(path):
+        return True
+    with open(path, 'r', errors='replace') as f:
+        return code_tokens(old) != code_tokens(f.read())
+
+
+def affected_stages(checkout, commit, changed, dirty, args):
+    """
+    Maps changed files to the stages they affect.  The graded content of a
+    file that was dirty at the last grade is not in git, so any change to
+    it counts as a code change.
+
+    Returns:
+        set: 'style' and/or the build targets whose sources' code changed.
+    """
+    stages = set()
+    for file in changed:
+        if file in grade.SOURCE_FILES:
+            stages.add('style')
+        targets = [target for target, sources in build.BUILD_TARGETS.items()
+                   if file.endswith('.h') or file in sources]
+        if targets and (file in dirty or code_changed(checkout, file, commit, args)):
+            stages.update(targets)
+    return stages
+
+
+def state_key(checkout):
+    return AutoTest_Cache.cache_key('incremental', checkout)
+
+
+def suite_hash():
+    """
+    Returns a hash of the AutoTest suite: the AutoTest_* files and the
+    build and cpplint configuration.
+    """
+    return AutoTest_Cache.cache_key(AutoTest_Cache.data_files_hash(AUTOTEST_DIR),
+                                    AutoTest_Cache.file_hash(os.path.join(AUTOTEST_DIR, 'CMakeLists.txt')),
+                                    AutoTest_Cache.file_hash(style.CONFIG_FILE))
+
+
+def plan_stages(checkout, head, state, args):
+    """
+    Decides which stages to run.
+
+    Returns:
+        set: The stages to run ('style' and build targets); every stage if
+        there is no usable previous grade.
+    """
+    everything = {'style'} | set(build.BUILD_TARGETS)
+    if args.full or not state or head is None:
+        return everything
+    if state['suite'] != suite_hash():
+        ot.report_info('[ REGRADE  ] The AutoTest suite changed')
+        return everything
+    if state['result']['build'] != 0:
+        return everything
+    changed = changed_files(checkout, state['commit'], args)
+    if changed is None:
+        ot.report_info(f'[ REGRADE  ] Cannot diff against {state["commit"][:12]}')
+        return everything
+    # uncommitted changes that were already graded as they are now
+    changed = [file for file in changed
+               if file not in state['dirty'] or
+               state['dirty'][file] != AutoTest_Cache.file_hash(os.path.join(checkout, file))]
+    stages = affected_stages(checkout, state['commit'], changed, state['dirty'], args)
+    ot.report_info(f'[ DIFF     ] {state["commit"][:12]}..{head[:12]}: '
+                   f'{" ".join(changed) or "no changes"}')
+    return stages
+
+
+def regrade(checkout, stages, state, args):
+    """
+    Runs the planned stages from the student source directory and reuses
+    the previous result of every other stage.
+
+    Returns:
+        dict: The result of the checkout, in the form of AutoTest_Grade.
+    """
+    previous = state['result'] if state else None
+    result = {'submission': os.path.basename(checkout), 'log': None, 'usage': []}
+    targets = [target for target in build.BUILD_TARGETS if target in stages]
+    test_args = ot.parse_arguments(['--timeout', str(args.timeout), '--memory-limit', str(args.memory_limit),
+                                    '--cpu-limit', str(args.cpu_limit)])
+    test_args.run_deadline = None
+    test_args.result_cache = None
+    start_dir = os.getcwd()
+
+    os.chdir(os.path.join(checkout, ot.PROJECT))
+    if targets:
+        result['build'] = build.setup_project('..', None, test_args, args.cache,
+                                              build.build_gtest(args.cache, test_args), targets)
+    else:
+        result['build'] = previous['build']
+    if 'style' in stages:
+        # the checkout's own files: the copies are only refreshed by a build
+        style_args = style.parse_arguments(['--jobs', '1'])
+        result['style'] = style.check_style(checkout, grade.SOURCE_FILES, style_args)
+    else:
+        result['style'] = previous['style']
+
+    os.chdir(checkout)
+    if result['build'] != 0:
+        # the binaries are gone: nothing to test, and nothing to reuse
+        ot.report_failure('Build failed: the output tests and gtests were not run')
+        result['tests'] = grade.skipped_tests(ot.TEST_CASES)
+        result['gtests'] = grade.skipped_tests(gtest_runner.source_tests())
+    else:
+        if 'main' in stages:
+            result['tests'] = grade.run_output_tests(ot.TEST_CASES, test_args, result['usage'])
+        else:
+            result['tests'] = previous['tests']
+        os.chdir(checkout)
+        if 'AutoTest_gtests' in stages:
+            result['gtests'] = grade.run_gtests(gtest_runner.source_tests(), test_args, result['usage'])
+        else:
+            result['gtests'] = previous['gtests']
+    os.chdir(start_dir)
+
+    reruns = {'style': 'RERUN' if 'style' in stages else 'REUSED'}
+    for target in build.BUILD_TARGETS:
+        reruns[TARGET_STAGES[target]] = ('SKIPPED' if result['build'] != 0 else
+                                         'RERUN' if target in stages else 'REUSED')
+    for stage, how in reruns.items():
+        ot.report_info(f'[ {how:<8} ] {stage}', {'RERUN': ot.GREEN, 'REUSED': ot.BLUE}.get(how, ot.RED))
+    return result
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Regrade only the stages changed since the last graded commit')
+    parser.add_argument("checkout", type=str, nargs='?', default='.',
+                        help="Student checkout (default: current directory)")
+    parser.add_argument("--full", action="store_true", default=False,
+                        help="Regrade every stage and remember the result")
+    parser.add_argument("--state-dir", type=str, default=STATE_DIR,
+                        help="Directory of the remembered grades")
+    parser.add_argument("--cache", type=str, default=build.CACHE_DIR,
+                        help="Shared cache directory for googletest and built targets")
+    parser.add_argument("--timeout", type=float, default=ot.TIMEOUT,
+                        help="Time budget in seconds for each test (0 for none)")
+    parser.add_argument("--memory-limit", type=int, default=ot.MEMORY_LIMIT,
+                        help="Address space limit in MB for each student program (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=ot.CPU_LIMIT,
+                        help="CPU time limit in seconds for each student program (0 for none)")
+    return parser.parse_args(argv)
+
+
+def incremental_main():
+    args = parse_arguments()
+    checkout = os.path.abspath(args.checkout)
+    head = git(checkout, ['rev-parse', 'HEAD'], args)
+    head = head.strip() if head else None
+    key = state_key(checkout)
+    state = AutoTest_Cache.cache_get(args.state_dir, key)
+
+    stages = plan_stages(checkout, head, state, args)
+    result = regrade(checkout, stages, state, args)
+    grade.report_result(result, argparse.Namespace(verbose=False))
+    if head:
+        AutoTest_Cache.cache_put(args.state_dir, key, {'commit': head, 'result': result, 'suite': suite_hash(),
+                                                       'dirty': dirty_files(checkout, head, args)})
+    passed, total = grade.count_passed(result)
+    sys.exit(0 if result['build'] == 0 and passed == total else 1)
+
+def main():
+    incremental_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Latency.py
+# Description: Python script to measure the latency of each BST_Project
+#              command within one interactive session
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# AutoTest_Benchmark.py times whole runs of main.  This script starts main
+# once on a generated movie queue and plays rounds of every USER_COMMANDS
+# command (search, add, watch, delete, print - in a random order each
+# round) against it, timing each command from the write of the command to
+# the arrival of its response.  It reports the mean, p50, p95 and p99 of
+# each command and compares them with a baseline measured the same way on
+# the reference solution, so e.g. a print that rebuilds the tree stands
+# out even though every output test passes.
+#
+# The baseline should be measured on the grading machine:
+#     ./BST_Project_AutoTest/AutoTest_Latency.py --binary /path/to/reference/main --save-baseline
+# Like AutoTest_OutputTest.py, run it from the student source directory:
+#     ./BST_Project_AutoTest/AutoTest_Latency.py
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import json
+import random
+import re
+import selectors
+import signal
+import subprocess
+import time
+
+import AutoTest_OutputTest as ot
+import AutoTest_Benchmark as bench
+import AutoTest_Results
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(AUTOTEST_DIR, 'AutoTest_latency_baseline.json')
+COMMANDS = ['search', 'add', 'watch', 'delete', 'print']
+# titles in the generated queue, and rounds of every command
+SIZE = 10000
+ROUNDS = 200
+# rounds run before the timed ones (page faults, allocator warm-up)
+WARMUP_ROUNDS = 10
+SEED = 2024
+STATISTICS = {'mean': None, 'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+# a command whose p50 is this many times the reference p50 is flagged
+LATENCY_TOLERANCE = 5
+# characters of earlier output searched again for a response split
+# between two reads
+OVERLAP = 256
+
+
+def session_steps(size, rounds):
+    """
+    Returns the steps of one session on the generated random-order queue
+    of size titles.  Searches alternate between queued and missing titles,
+    adds use missing titles and watch/delete remove queued ones, so every
+    command gets the response it is expected to.  A print is complete
+    when the last title in order has been printed.
+
+    Returns:
+        list: Steps from AutoTest_OutputTest.interactive_step(), each with
+        its 'command'.
+    """
+    rng = random.Random(SEED + size)
+    queued = bench.generate_queue(size, 'random')
+    missing = [bench.movie_title(2 * i + 1) for i in range(size)]
+    rng.shuffle(missing)
+    steps = []
+    for _ in range(rounds):
+        commands = list(COMMANDS)
+        rng.shuffle(commands)
+        for command in commands:
+            if command == 'search' and rng.random() < 0.5:
+                step = ot.interactive_step(command, rng.choice(missing), 'not found')
+            elif command == 'search':
+                step = ot.interactive_step(command, rng.choice(queued), 'found')
+            elif command == 'add':
+                queued.append(missing.pop())
+                step = ot.interactive_step(command, queued[-1], 'added')
+            elif command in ('watch', 'delete'):
+                index = rng.randrange(len(queued))
+                queued[index], queued[-1] = queued[-1], queued[index]
+                step = ot.interactive_step(command, queued.pop(), 'watched' if command == 'watch' else 'removed')
+            else:
+                step = ot.interactive_step(command, expect=rf'{re.escape(max(queued))}\s')
+            step['command'] = command
+            steps.append(step)
+    return steps
+
+
+def time_session(binary, steps, args):
+    """
+    Runs binary once and plays steps against it, timing each response from
+    the write of its command to the read that completed it.
+
+    Returns:
+        tuple: (latency in seconds of each step, failure message or None)
+    """
+    proc = subprocess.Popen([binary], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, start_new_session=True)
+    ot.limit_resources(proc.pid, args)
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ)
+    fd = proc.stdout.fileno()
+    latencies = []
+    failure = None
+    pending = ''
+    try:
+        for step in steps:
+            expect = ot.compile_pattern(step['expect'])
+            rejects = [ot.compile_pattern(reject) for reject in step['reject']]
+            start = time.perf_counter()
+            try:
+                proc.stdin.write(step['send'].encode())
+                proc.stdin.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                failure = f'program ended before {step["description"]}'
+                break
+            deadline = start + ot.RESPONSE_TIMEOUT
+            arrived = start
+            position = 0
+            while True:
+                match = expect.search(pending, position)
+                if match:
+                    latencies.append(arrived - start)
+                    pending = pending[match.end():]
+                    break
+                if any(reject.search(pending) for reject in rejects):
+                    failure = f'wrong response to {step["description"]}'
+                    break
+                position = max(len(pending) - OVERLAP, 0)
+                if not selector.select(max(deadline - time.perf_counter(), 0)):
+                    failure = f'no response to {step["description"]}'
+                    break
+                chunk = os.read(fd, 65536)
+                arrived = time.perf_counter()
+                if not chunk:
+                    failure = f'program ended before responding to {step["description"]}'
+                    break
+                pending += chunk.decode(errors='replace')
+            if failure:
+                break
+        if failure is None:
+            try:
+                proc.stdin.write(f'{ot.USER_COMMANDS["exit"]}\n'.encode())
+                proc.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            # the rest of the output, up to the end of the program
+            deadline = time.perf_counter() + ot.RESPONSE_TIMEOUT
+            while selector.select(max(deadline - time.perf_counter(), 0)) and os.read(fd, 65536):
+                pass
+    finally:
+        if proc.poll() is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        selector.close()
+        proc.stdout.close()
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.wait()
+    return latencies, failure
+
+
+def latency_statistics(steps, latencies):
+    """
+    Returns {command: {'count', 'mean', 'p50', 'p95', 'p99'}} in seconds,
+    over the latencies of the steps of each command.
+    """
+    statistics = {}
+    for command in COMMANDS:
+        values = sorted(latency for step, latency in zip(steps, latencies) if step['command'] == command)
+        if not values:
+            continue
+        statistics[command] = {'count': len(values)}
+        for name, fraction in STATISTICS.items():
+            statistics[command][name] = (sum(values) / len(values) if fraction is None
+                                         else AutoTest_Results.percentile(values, fraction))
+    return statistics
+
+
+def read_baseline(baseline_file, size):
+    """
+    Returns the baseline statistics for a queue of size titles, or None if
+    there is no baseline measured on that size.
+    """
+    try:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return baseline['statistics'] if baseline.get('size') == size else None
+
+
+def write_baseline(baseline_file, statistics, args):
+    with open(baseline_file, 'w') as f:
+        json.dump({'size': args.size, 'rounds': args.rounds, 'statistics': statistics}, f, indent=2)
+    return
+
+
+def report_latency(statistics, baseline, args):
+    """
+    Prints the statistics of each command in ms, with the reference value
+    in brackets, and flags commands much slower than the reference.
+
+    Returns:
+        list: The flagged commands.
+    """
+    print(f'{ot.BLUE}[==========]{ot.RESET}')
+    print(f'{ot.BLUE}[ LATENCY  ] {args.size} titles, {args.rounds} rounds, ms'
+          f'{" (reference in brackets)" if baseline else ""}{ot.RESET}')
+    print(f'{ot.BLUE}[----------]{ot.RESET}')
+    width = 18 if baseline else 10
+    # aligned with the [  PASSED  ] of the rows
+    ot.report_info(f'{"":<13}{"command":<8}' + ''.join(f'{name:>{width}}' for name in STATISTICS), ot.BLUE)
+    flagged = []
+    for command, values in statistics.items():
+        reference = baseline.get(command) if baseline else None
+        text = f'{command:<8}'
+        for name in STATISTICS:
+            cell = f'{values[name] * 1000:.3f}'
+            if reference:
+                cell += f' [{reference[name] * 1000:.3f}]'
+            text += f'{cell:>{width}}'
+        if reference and values['p50'] > LATENCY_TOLERANCE * reference['p50']:
+            flagged.append(command)
+            ot.report_failure(f'{text} {values["p50"] / reference["p50"]:.1f}x slower than the reference')
+        else:
+            ot.report_success(text)
+    return flagged
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the latency of each command within one session of main')
+    parser.add_argument("--size", type=int, default=SIZE,
+                        help="Titles in the generated movie queue")
+    parser.add_argument("--rounds", type=int, default=ROUNDS,
+                        help="Timed rounds of every command")
+    parser.add_argument("--binary", type=str, default=ot.EXECUTABLE,
+                        help="The program to measure (default: the student's main)")
+    parser.add_argument("--baseline", type=str, default=BASELINE_FILE,
+                        help="Baseline measured on the reference solution")
+    parser.add_argument("--save-baseline", action="store_true", default=False,
+                        help="Write the measurement to the baseline file instead of comparing with it")
+    parser.add_argument("--memory-limit", type=int, default=ot.MEMORY_LIMIT,
+                        help="Address space limit in MB for the program (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=ot.CPU_LIMIT,
+                        help="CPU time limit in seconds for the program (0 for none)")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Verbose output")
+    parser.add_argument("-d", "--debug", action="store_true", default=False,
+                        help="Debug output")
+    return parser.parse_args(argv)
+
+
+def latency_main():
+    args = parse_arguments()
+    if args.binary != ot.EXECUTABLE:
+        args.binary = os.path.abspath(args.binary)
+    args.baseline = os.path.abspath(args.baseline)
+    # every round adds one title and removes two
+    if args.size < 2 * (args.rounds + WARMUP_ROUNDS) + 1:
+        ot.report_failure(f'A queue of {args.size} titles is too small for {args.rounds} rounds')
+        sys.exit(2)
+
+    ot.setup(args)
+    if not ot.file_exists(args.binary):
+        ot.report_failure(f'{args.binary} not found')
+        sys.exit(ot.NOT_FOUND_RC)
+    os.makedirs(bench.BENCH_DIR, exist_ok=True)
+    ot.stage_input_file(bench.queue_file(args.size, 'random'), ot.STUDENT_MOVIE_QUEUE_FILE)
+    steps = session_steps(args.size, WARMUP_ROUNDS + args.rounds)
+    latencies, failure = time_session(args.binary, steps, args)
+    ot.stage_input_file(os.path.join(ot.DATA_DIR, ot.AUTOTEST_MOVIE_QUEUE_FILE), ot.STUDENT_MOVIE_QUEUE_FILE)
+    ot.cleanup(args)
+    if failure:
+        ot.report_failure(f'{failure} after {len(latencies)} commands')
+        sys.exit(1)
+
+    timed = WARMUP_ROUNDS * len(COMMANDS)
+    statistics = latency_statistics(steps[timed:], latencies[timed:])
+    if args.save_baseline:
+        write_baseline(args.baseline, statistics, args)
+        report_latency(statistics, None, args)
+        ot.report_info(f'[==========] Baseline written to {args.baseline}', ot.BLUE)
+        sys.exit(0)
+
+    baseline = read_baseline(args.baseline, args.size)
+    flagged = report_latency(statistics, baseline, args)
+    if not baseline:
+        ot.report_info(f'[==========] No baseline for {args.size} titles in {args.baseline} '
+                       f'(measure the reference solution with --save-baseline)', ot.BLUE)
+    sys.exit(1 if flagged else 0)
+
+def main():
+    latency_main()
+
+if __name__ == "__main__":
+    main()
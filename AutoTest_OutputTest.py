@@ -11,6 +11,25 @@ import subprocess
 import shutil
 import argparse
 import re
+import difflib
+import signal
+import resource
+import time
+import concurrent.futures
+import asyncio
+import contextlib
+import functools
+import inspect
+import tempfile
+import mmap
+import selectors
+import threading
+import json
+import xml.etree.ElementTree as ET
+
+import AutoTest_Alloc
+import AutoTest_Cache
+import AutoTest_Results
 
 
 #--------------------------------------------------------------------------
@@ -53,6 +72,22 @@ AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_ADDS = 'AutoTest_movie_queue_updated_adds.txt'
 AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_DELS = 'AutoTest_movie_queue_updated_dels.txt'
 STUDENT_MOVIE_QUEUE_UPDATE_FILE = 'movie_queue_updated.txt'
 
+# per-test scratch directories (created under TEST_DIR) used by --jobs
+SANDBOX_DIR = 'AutoTest_sandbox'
+
+# wall-clock budget (seconds) for each test; override per test below
+TIMEOUT = 10
+TEST_TIMEOUTS = {}
+
+# resource ceilings for each student process (main, AutoTest_gtests), so a
+# runaway program cannot push the grading host into swap; 0 for none
+MEMORY_LIMIT = 1024     # MB of address space
+CPU_LIMIT = 30          # seconds of CPU time
+
+# bytes of output kept from each captured process; the rest is counted and
+# dropped, so a program printing in a loop cannot exhaust memory; 0 for none
+OUTPUT_LIMIT = 1024 * 1024
+
 #--------------------------------------------------------------------------
 # Program commands - modify as needed
 #--------------------------------------------------------------------------
@@ -120,6 +155,48 @@ def report_info(msg, color=RESET):
     return
 
 
+#--------------------------------------------------------------------------
+# Profiling (--profile) - times the grader's own phases
+#--------------------------------------------------------------------------
+PROFILE_FILE = 'AutoTest_profile.json'
+PROFILE_SUMMARY_LINES = 10
+PROFILING = False
+PROFILE_EVENTS = []
+PROFILE_TEST = None
+
+@contextlib.contextmanager
+def profile_span(phase, detail=None):
+    """
+    Records the wall-clock time spent in a phase as a Chrome trace event,
+    attributed to the current test.  Does nothing unless PROFILING is set.
+    """
+    if not PROFILING:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        event = {'name': phase, 'cat': 'AutoTest', 'ph': 'X',
+                 'ts': start / 1000, 'dur': (time.perf_counter_ns() - start) / 1000,
+                 'pid': os.getpid(), 'tid': 0, 'args': {'test': PROFILE_TEST}}
+        if detail:
+            event['args']['detail'] = detail
+        PROFILE_EVENTS.append(event)
+
+def profiled(phase):
+    """
+    Decorator that records every call of a function as a profile_span.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_span(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 def execute_command(cmd, args=None, accept_rc=[0]):
     """
     Executes a shell command and provides verbose and debug output based on the given arguments.
@@ -131,7 +208,7 @@ def execute_command(cmd, args=None, accept_rc=[0]):
          int: The return code of the executed command.
     Behavior:
     - If `args.verbose` is True, prints the command execution details.
-    - If `args.debug` is False, executes the command using `subprocess.call`.
+    - If `args.debug` is False, executes the command using `run_process`, subject to the test's time budget.
     - If `args.verbose` is True, prints the result of the command execution, including specific messages for segmentation faults (rc=139) and uncaught exceptions (rc=134).
     """
     rc = 0
@@ -146,20 +223,645 @@ def execute_command(cmd, args=None, accept_rc=[0]):
         print(f'{GREEN}[==========]{RESET}')
 
     if not args.debug:
-        rc = subprocess.call(cmd, shell=True)
+        rc, _ = run_process(cmd, args, shell=True)
+        record_rc(rc, args, accept_rc)
 
     if args.verbose:
-        if rc == 139:
-            report_failure('Segmentation Fault')
-        elif rc == 134:
-            report_failure('Uncaught Exception')
-        elif rc not in accept_rc:
-            report_failure(f'rc = {rc}')
-        else:
-            report_success(f'rc = {rc}')
+        report_rc(rc, accept_rc)
     return rc
 
 
+# return code used for a program killed because it ran out of time
+TIMEOUT_RC = 124
+# return code used for a program that could not be started (as the shell does)
+NOT_FOUND_RC = 127
+# a program that exceeds CPU_LIMIT is killed by SIGXCPU
+CPU_LIMIT_RC = 128 + signal.SIGXCPU
+
+RC_REASONS = {139: 'Segmentation Fault',
+              134: 'Uncaught Exception',
+              TIMEOUT_RC: 'Timeout',
+              NOT_FOUND_RC: 'Program Not Found',
+              CPU_LIMIT_RC: 'CPU Limit Exceeded'
+             }
+
+# failure classes recorded in the results (see record_failure)
+FAILURE_CLASSES = {139: 'segfault',
+                   134: 'exception',
+                   TIMEOUT_RC: 'timeout',
+                   NOT_FOUND_RC: 'not found',
+                   CPU_LIMIT_RC: 'cpu limit'
+                  }
+# number of output lines kept with a failed expectation
+MISMATCH_LINES = 5
+# lines of output shown in a failure report, and the characters shown of each
+EXCERPT_LINES = 40
+EXCERPT_LINE_WIDTH = 200
+# appended to output cut at the output limit
+TRUNCATION_MARKER = '[AutoTest: output truncated, {} more bytes]'
+
+def record_failure(args, failure, message, lines=None):
+    """
+    Records why the current test failed in args.test_result, if a result is
+    being recorded.  Only the first failure of a test is kept.
+
+    Args:
+        args: Command-line arguments.
+        failure (str): The failure class (e.g. 'segfault', 'diff mismatch').
+        message (str): A one line description.
+        lines (list, optional): The first mismatching lines.
+    """
+    result = getattr(args, 'test_result', None)
+    if result is not None and not result.get('failure'):
+        result['failure'] = failure
+        result['message'] = message
+        result['mismatch'] = [clip_line(line) for line in lines or []]
+    return
+
+def clip_line(line):
+    """
+    Returns a line cut to EXCERPT_LINE_WIDTH characters.
+    """
+    return line if len(line) <= EXCERPT_LINE_WIDTH else f'{line[:EXCERPT_LINE_WIDTH]} ...'
+
+def excerpt_window(count, center):
+    """
+    Returns (start, end) of the at most EXCERPT_LINES of count lines shown
+    around line index center.
+    """
+    start = max(min(center - EXCERPT_LINES // 4, count - EXCERPT_LINES), 0)
+    return start, min(start + EXCERPT_LINES, count)
+
+def excerpt(text, center=0):
+    """
+    Returns a bounded excerpt of program output for a failure report: the
+    lines around line index center, each clipped, with the number of lines
+    left out before and after.
+    """
+    lines = text.splitlines()
+    start, end = excerpt_window(len(lines), center)
+    shown = [clip_line(line) for line in lines[start:end]]
+    if start:
+        shown.insert(0, f'[... {start} lines ...]')
+    if end < len(lines):
+        shown.append(f'[... {len(lines) - end} more lines ...]')
+    return '\n'.join(shown)
+
+def output_limit(args):
+    return getattr(args, 'output_limit', OUTPUT_LIMIT)
+
+def read_bounded(file, limit):
+    """
+    Returns the text of a file the program wrote, cut at limit bytes (0 for
+    no limit) with TRUNCATION_MARKER.
+    """
+    with open(file, 'rb') as f:
+        data = f.read(limit or -1)
+        dropped = os.fstat(f.fileno()).st_size - len(data)
+    text = data.decode(errors='replace')
+    if dropped > 0:
+        text += '\n' + TRUNCATION_MARKER.format(dropped) + '\n'
+    return text
+
+def record_rc(rc, args, accept_rc=[0]):
+    """
+    Records a program return code that is not accepted as a test failure.
+    """
+    if rc not in accept_rc:
+        record_failure(args, FAILURE_CLASSES.get(rc, 'rc'), f'rc = {rc}')
+    return
+
+def time_remaining(args):
+    """
+    Returns the seconds left before the current test or the whole run
+    exceeds its time budget, or None if there is no budget.
+    """
+    deadlines = [d for d in (getattr(args, 'test_deadline', None),
+                             getattr(args, 'run_deadline', None)) if d]
+    if not deadlines:
+        return None
+    return min(deadlines) - time.monotonic()
+
+def run_process(cmd, args, test_input=None, shell=False, capture=False, limits=False, env=None):
+    """
+    Runs a process in its own process group, killing the whole group if it
+    exceeds the time budget from time_remaining(args).  The resources the
+    process used are added to args.test_result (see record_usage).
+
+    Args:
+        cmd (str or list): The command to execute.
+        args: Command-line arguments.
+        test_input (str, optional): Text to send to stdin. Defaults to None (inherit stdin).
+        shell (bool, optional): Run the command through the shell. Defaults to False.
+        capture (bool, optional): Capture combined stdout/stderr. Defaults to False.
+        limits (bool, optional): Apply the memory and CPU limits for student
+            programs (args.memory_limit, args.cpu_limit). Defaults to False.
+        env (dict, optional): Variables to set in the environment of the
+            process; a value of None removes the variable. Defaults to None.
+
+    Returns:
+        tuple: (rc, output) - rc is 128+signal if killed by a signal,
+        TIMEOUT_RC if the time budget ran out and NOT_FOUND_RC if the program
+        could not be started; output is '' unless captured.
+    """
+    with profile_span('execute', cmd if isinstance(cmd, str) else ' '.join(cmd)):
+        with counting_allocations(args, limits) as alloc_env:
+            if alloc_env:
+                env = dict(env or {}, **alloc_env)
+            rc, output, usage = wait_process(cmd, args, test_input, shell, capture, limits, env)
+    record_usage(args, usage)
+    if limits and usage and getattr(args, 'verbose', False):
+        report_usage(usage)
+    return rc, output
+
+def reap_process(proc, timeout):
+    """
+    Waits for a process like proc.wait(timeout), but reaps it with wait4 to
+    keep the resource usage of the process (and of the children it waited
+    for), and sets proc.returncode.
+
+    Linux carries the peak RSS of the forking process over into its child,
+    so a peak RSS at or below rss_floor_kb (the grader's own peak when the
+    process started, see wait_process) only says that the program used no
+    more than that.
+
+    Returns:
+        dict: The resource usage, or None if the process was already reaped.
+
+    Raises:
+        subprocess.TimeoutExpired: If the process did not exit within
+            timeout seconds (None for no limit).
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    try:
+        while True:
+            pid, status, rusage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+            if pid == proc.pid:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            # back off like Popen.wait does, up to 50 ms between polls
+            delay = min(delay * 2, remaining, 0.05)
+            time.sleep(delay)
+    except ChildProcessError:
+        proc.returncode = 0
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {'max_rss_kb': rusage.ru_maxrss,
+            'user': round(rusage.ru_utime, 6), 'sys': round(rusage.ru_stime, 6),
+            'minor_faults': rusage.ru_minflt, 'major_faults': rusage.ru_majflt}
+
+def limit_resources(pid, args):
+    """
+    Applies the memory and CPU limits to a program that was just started.
+    prlimit from the grader rather than a preexec_fn in the child, which
+    is not safe while other threads run (e.g. the shards of
+    AutoTest_GTest.py); the program starts a moment before its limits.
+    """
+    memory = getattr(args, 'memory_limit', MEMORY_LIMIT)
+    cpu = getattr(args, 'cpu_limit', CPU_LIMIT)
+    try:
+        if memory:
+            resource.prlimit(pid, resource.RLIMIT_AS, (memory << 20, memory << 20))
+        if cpu:
+            # SIGXCPU at the soft limit, SIGKILL a second later
+            resource.prlimit(pid, resource.RLIMIT_CPU, (int(cpu), int(cpu) + 1))
+    except ProcessLookupError:
+        # it already exited
+        pass
+    return
+
+def record_usage(args, usage):
+    """
+    Adds the resource usage of a process to the current test result: the
+    peak RSS is the largest of any process, times and faults are summed.
+    """
+    result = getattr(args, 'test_result', None)
+    if result is None or not usage:
+        return
+    if not result.get('usage'):
+        result['usage'] = dict(usage)
+        return
+    total = result['usage']
+    for field in ('max_rss_kb', 'rss_floor_kb'):
+        total[field] = max(total[field], usage[field])
+    for field in ('user', 'sys'):
+        total[field] = round(total[field] + usage[field], 6)
+    for field in ('minor_faults', 'major_faults'):
+        total[field] += usage[field]
+    return
+
+@contextlib.contextmanager
+def counting_allocations(args, limits=True):
+    """
+    Counts the allocations of the student program run in the block with the
+    AutoTest_alloc.c shim, if --alloc built one (args.alloc_shim), and adds
+    them to args.test_result (see AutoTest_Alloc).
+
+    Yields:
+        dict: The environment variables that load the shim, or {} if the
+        allocations are not counted.
+    """
+    shim = getattr(args, 'alloc_shim', None)
+    if not shim or not limits:
+        yield {}
+        return
+    fd, counts_file = tempfile.mkstemp(prefix='AutoTest_alloc_')
+    os.close(fd)
+    try:
+        yield AutoTest_Alloc.shim_environment(shim, counts_file)
+        counts = AutoTest_Alloc.read_counts(counts_file)
+    finally:
+        os.remove(counts_file)
+    record_alloc(args, counts)
+
+def record_alloc(args, counts):
+    """
+    Adds the allocation counts of a program run to the current test result;
+    a program that crashed or was killed has none.
+    """
+    result = getattr(args, 'test_result', None)
+    if result is None or counts is None:
+        return
+    result['alloc'] = AutoTest_Alloc.add_counts(result.get('alloc'), counts)
+    if getattr(args, 'verbose', False):
+        report_info(f'[ ALLOC    ] {AutoTest_Alloc.format_counts(counts)}', GREEN)
+    return
+
+def format_rss(usage):
+    """
+    Returns the peak RSS of a usage record, as an upper bound if it is not
+    above the floor inherited from the grader (see reap_process).
+    """
+    if usage['max_rss_kb'] <= usage['rss_floor_kb']:
+        return f'<={usage["max_rss_kb"]} KB'
+    return f'{usage["max_rss_kb"]} KB'
+
+def format_usage(usage):
+    return (f'peak RSS {format_rss(usage)}, CPU {usage["user"]:.3f}s user '
+            f'{usage["sys"]:.3f}s sys, page faults {usage["minor_faults"]} minor '
+            f'{usage["major_faults"]} major')
+
+def report_usage(usage):
+    report_info(f'[ RUSAGE   ] {format_usage(usage)}', GREEN)
+    return
+
+def wait_process(cmd, args, test_input, shell, capture, limits=False, env=None):
+    """
+    Starts a process and waits for it within the time budget (see run_process).
+
+    Returns:
+        tuple: (rc, output, resource usage or None)
+    """
+    timeout = time_remaining(args)
+    if timeout is not None and timeout <= 0:
+        return TIMEOUT_RC, '', None
+
+    sys.stdout.flush()
+    pipe = subprocess.PIPE if capture else None
+    rss_floor = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if env:
+        env = {name: value for name, value in dict(os.environ, **env).items() if value is not None}
+    try:
+        proc = subprocess.Popen(cmd, shell=shell, start_new_session=True, env=env,
+                                stdin=subprocess.PIPE if test_input is not None else None,
+                                stdout=pipe, stderr=subprocess.STDOUT if capture else None,
+                                text=True, errors='replace')
+    except OSError as e:
+        return NOT_FOUND_RC, f'{cmd}: {e.strerror}\n', None
+    if limits:
+        limit_resources(proc.pid, args)
+    output = ''
+    try:
+        if capture:
+            output = communicate_bounded(proc, test_input, timeout, output_limit(args))
+        elif test_input is not None:
+            threading.Thread(target=write_input, args=(proc.stdin, test_input), daemon=True).start()
+        usage = reap_process(proc, time_remaining(args))
+        rc = proc.returncode
+        if rc < 0:
+            rc = 128 - rc
+    except subprocess.TimeoutExpired as e:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        usage = reap_process(proc, None)
+        if e.output is not None:
+            output = e.output
+        rc = TIMEOUT_RC
+    if usage:
+        usage['rss_floor_kb'] = rss_floor
+    return rc, output, usage
+
+def write_input(stream, text):
+    """
+    Writes stdin text to a process and closes its stdin; a process that
+    exits without reading all of it is not an error.
+    """
+    try:
+        stream.write(text)
+        stream.close()
+    except OSError:
+        pass
+    return
+
+def communicate_bounded(proc, test_input, timeout, limit):
+    """
+    Like proc.communicate() for a process with captured output, except that
+    only the first limit bytes of output are kept (0 for no limit): the
+    rest is read and dropped as it arrives, and TRUNCATION_MARKER with the
+    number of dropped bytes is appended.  It returns at the end of the
+    output and leaves reaping the process to reap_process.
+
+    Returns:
+        str: The captured output.
+
+    Raises:
+        subprocess.TimeoutExpired: If the output did not end within timeout
+            seconds; its output attribute holds the output so far.
+    """
+    if test_input is not None:
+        threading.Thread(target=write_input, args=(proc.stdin, test_input), daemon=True).start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    kept = bytearray()
+    dropped = 0
+
+    def text():
+        output = kept.decode(errors='replace')
+        if dropped:
+            output += f'\n{TRUNCATION_MARKER.format(dropped)}\n'
+        return output
+
+    with proc.stdout, selectors.DefaultSelector() as selector:
+        selector.register(proc.stdout, selectors.EVENT_READ)
+        while True:
+            wait = None if deadline is None else deadline - time.monotonic()
+            if wait is not None and wait <= 0:
+                raise subprocess.TimeoutExpired(proc.args, timeout, output=text())
+            if not selector.select(wait):
+                continue
+            chunk = os.read(proc.stdout.fileno(), 1 << 16)
+            if not chunk:
+                break
+            room = len(chunk) if not limit else max(limit - len(kept), 0)
+            kept += chunk[:room]
+            dropped += len(chunk) - min(room, len(chunk))
+    return text()
+
+def report_rc(rc, accept_rc=[0]):
+    """
+    Prints the result of a program execution, including specific messages
+    for segmentation faults (rc=139), uncaught exceptions (rc=134) and
+    timeouts (rc=TIMEOUT_RC).
+    """
+    if rc in RC_REASONS and rc not in accept_rc:
+        report_failure(RC_REASONS[rc])
+    elif rc not in accept_rc:
+        report_failure(f'rc = {rc}')
+    else:
+        report_success(f'rc = {rc}')
+    return
+
+
+def save_files(args):
+    """
+    Returns True if test input/output files should be written to disk.
+    """
+    return args.debug or getattr(args, 'savefiles', False)
+
+
+def execute_program(test_input, input_file, output_file, args=None, accept_rc=[0]):
+    """
+    Executes EXECUTABLE directly (no shell), feeding stdin from memory and
+    capturing stdout/stderr into memory.
+    Parameters:
+         test_input (str): The text to send to the program's stdin.
+         input_file (str): Name of the stdin file, written only if save_files(args).
+         output_file (str): Name of the output file, written only if save_files(args).
+         args (object, optional): An object containing verbose and debug flags. Defaults to None.
+         accept_rc (list, optional): A list of acceptable return codes. Defaults to [0].
+    Returns:
+         tuple: (rc, output) - the return code and the combined stdout/stderr text.
+    Behavior:
+    - If `args.verbose` is True, prints the equivalent shell command.
+    - If `args.debug` is False, executes the program using `run_process`.
+    - A program killed by a signal reports rc 128+signal, as the shell would,
+      and a program that runs out of time is killed and reports TIMEOUT_RC.
+    """
+    rc = 0
+    output = ''
+
+    if not args:
+        args.verbose = False
+        args.debug = False
+
+    if save_files(args) and input_file:
+        with open(input_file, 'w') as f:
+            f.write(test_input)
+
+    if args.verbose:
+        cmd = EXECUTABLE
+        if input_file:
+            cmd += f' < {input_file}'
+        cmd += f' > {output_file} 2>&1'
+        print(f'{GREEN}[==========]{RESET}')
+        print(f'{GREEN}[ EXECUTE  ] {cmd}{RESET}')
+        print(f'{GREEN}[==========]{RESET}')
+
+    if not args.debug:
+        rc, output = run_process([EXECUTABLE], args, test_input=test_input, capture=True, limits=True)
+        record_rc(rc, args, accept_rc)
+
+    if save_files(args) and output_file:
+        with open(output_file, 'w') as f:
+            f.write(output)
+
+    if args.verbose:
+        report_rc(rc, accept_rc)
+    return rc, output
+
+
+#--------------------------------------------------------------------------
+# Interactive driver - sends one command at a time and waits for its
+# response, killing the program as soon as a response is wrong or missing
+#--------------------------------------------------------------------------
+# seconds to wait for the response to a single command
+RESPONSE_TIMEOUT = 2
+# every response the program gives to a command on a movie
+MOVIE_RESPONSES = ['found', 'not found', 'added', 'already present', 'watched', 'removed']
+
+def interactive_step(user_cmd, movie=None, response=None, expect=None):
+    """
+    Returns one step of an interactive session.
+
+    Args:
+        user_cmd (str): A key of USER_COMMANDS.
+        movie (str, optional): The movie title sent after the command.
+        response (str, optional): The expected entry of MOVIE_RESPONSES for the movie.
+        expect (str, optional): An expected regex, if not a movie response.
+
+    Returns:
+        dict: 'send' (stdin text), 'expect' (regex or None), 'reject' (regexes
+        that mean the response is wrong) and 'description'.
+    """
+    send = f'{USER_COMMANDS[user_cmd]}\n'
+    description = user_cmd
+    reject = []
+    if movie is not None:
+        send += f'{movie}\n'
+        description += f' {movie}'
+    if response:
+        expect = movie_response(movie, response)
+        reject = [movie_response(movie, other) for other in MOVIE_RESPONSES if other != response]
+    return {'send': send, 'expect': expect, 'reject': reject, 'description': description}
+
+async def drive_program(steps, args):
+    """
+    Runs EXECUTABLE and plays steps against its streaming output.
+
+    Returns:
+        tuple: (rc, output, failed step index or None, failure class, message)
+    """
+    with counting_allocations(args) as alloc_env:
+        return await play_steps(steps, args, dict(os.environ, **alloc_env) if alloc_env else None)
+
+async def play_steps(steps, args, env):
+    """
+    Runs EXECUTABLE with the environment env (None for this one) and plays
+    steps against it (see drive_program).
+    """
+    proc = await asyncio.create_subprocess_exec(EXECUTABLE, stdin=asyncio.subprocess.PIPE,
+                                                stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.STDOUT,
+                                                start_new_session=True, env=env)
+    limit_resources(proc.pid, args)
+    transcript = bytearray()
+    dropped = 0
+    limit = output_limit(args)
+    pending = ''
+    failure = None
+
+    async def read_chunk(timeout):
+        nonlocal dropped
+        chunk = await asyncio.wait_for(proc.stdout.read(4096), timeout)
+        room = len(chunk) if not limit else max(limit - len(transcript), 0)
+        transcript.extend(chunk[:room])
+        dropped += len(chunk) - min(room, len(chunk))
+        return chunk.decode(errors='replace')
+
+    for index, step in enumerate(steps):
+        try:
+            proc.stdin.write(step['send'].encode())
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        if not step['expect']:
+            continue
+
+        deadline = time.monotonic() + RESPONSE_TIMEOUT
+        remaining = time_remaining(args)
+        if remaining is not None:
+            deadline = min(deadline, time.monotonic() + remaining)
+        while failure is None:
+            match = compile_pattern(step['expect']).search(pending)
+            if match:
+                pending = pending[match.end():]
+                break
+            if any(compile_pattern(reject).search(pending) for reject in step['reject']):
+                failure = (index, 'wrong response', f'wrong response to {step["description"]}')
+                break
+            try:
+                text = await read_chunk(max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                failure = (index, 'missing response', f'no response to {step["description"]}')
+                break
+            if not text:
+                failure = (index, 'missing response', f'program ended before responding to {step["description"]}')
+                break
+            # a response is short; only the end of a flood of output can hold it
+            pending = (pending + text)[-limit:] if limit else pending + text
+        if failure:
+            break
+
+    if failure is None:
+        # all responses seen - let the program exit on its own
+        proc.stdin.close()
+        remaining = time_remaining(args)
+        deadline = time.monotonic() + (RESPONSE_TIMEOUT if remaining is None else max(remaining, 0))
+        try:
+            # one deadline for all of it: a program may keep printing forever
+            while await read_chunk(deadline - time.monotonic()):
+                pass
+            rc = await asyncio.wait_for(proc.wait(), RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            failure = (len(steps) - 1, 'timeout', 'program did not exit')
+    if failure is not None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        # wait() also waits for EOF, which a full pipe would hold back
+        while await proc.stdout.read(65536):
+            pass
+        rc = await proc.wait()
+        # a crash explains the failure better than the missing response
+        if rc >= 0 or -rc == signal.SIGKILL:
+            rc = TIMEOUT_RC if failure[1] == 'timeout' else 1
+    if rc < 0:
+        rc = 128 - rc
+    index, failure_class, message = failure if failure else (None, None, '')
+    output = transcript.decode(errors='replace')
+    if dropped:
+        output += f'\n{TRUNCATION_MARKER.format(dropped)}\n'
+    return rc, output, index, failure_class, message
+
+def execute_interactive(steps, output_file, args=None, accept_rc=[0]):
+    """
+    Runs EXECUTABLE interactively: sends each step and waits for its expected
+    response on the streaming output before sending the next one.  The
+    program is killed as soon as a response is wrong or missing.
+
+    Args:
+        steps (list): Steps from interactive_step().
+        output_file (str): Name of the output file, written only if save_files(args).
+        args (object, optional): An object containing verbose and debug flags. Defaults to None.
+        accept_rc (list, optional): A list of acceptable return codes. Defaults to [0].
+
+    Returns:
+        tuple: (rc, output) - rc is 1 if a response was wrong or missing.
+    """
+    rc = 0
+    output = ''
+
+    if args.verbose:
+        print(f'{GREEN}[==========]{RESET}')
+        print(f'{GREEN}[ EXECUTE  ] {EXECUTABLE} (interactive, {len(steps)} commands){RESET}')
+        print(f'{GREEN}[==========]{RESET}')
+
+    if not args.debug:
+        with profile_span('execute', f'{EXECUTABLE} (interactive)'):
+            rc, output, index, failure, message = asyncio.run(drive_program(steps, args))
+        if index is not None:
+            record_failure(args, FAILURE_CLASSES.get(rc, failure),
+                           f'command {index + 1}: {message}', output.splitlines()[-MISMATCH_LINES:])
+            if args.verbose:
+                report_failure(f'Command {index + 1} ({steps[index]["description"]}): {message}')
+                report_info(f'\nActual:\n{excerpt(output, len(output.splitlines()) - 1)}')
+        else:
+            record_rc(rc, args, accept_rc)
+
+    if save_files(args) and output_file:
+        with open(output_file, 'w') as f:
+            f.write(output)
+
+    if args.verbose:
+        report_rc(rc, accept_rc)
+    return rc, output
+
+
 def file_print(file, args=None):
     """
     Prints the contents of a file.
@@ -176,6 +878,155 @@ def file_print(file, args=None):
     print(filedata)
     return
 
+DIFF_COLUMN_WIDTH = 61
+WHITESPACE_RUN = re.compile(r'\s+')
+
+def normalize_lines(text):
+    """
+    Normalizes text the way `diff --ignore-case --ignore-blank-lines
+    --ignore-space-change` compares it.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        list: (line number, original line, comparison key) for each non-blank line.
+    """
+    lines = []
+    for number, line in enumerate(text.splitlines(), 1):
+        key = WHITESPACE_RUN.sub(' ', line.rstrip()).lower()
+        if key:
+            lines.append((number, line, key))
+    return lines
+
+def report_rows(rows, center=0):
+    """
+    Prints the (text, color) rows of a diff report, at most EXCERPT_LINES
+    of them around row index center, with the number of rows left out.
+    """
+    start, end = excerpt_window(len(rows), center)
+    if start:
+        report_info(f'[... {start} lines ...]', BLUE)
+    for text, color in rows[start:end]:
+        report_info(clip_line(text), color)
+    if end < len(rows):
+        report_info(f'[... {len(rows) - end} more lines ...]', BLUE)
+    return
+
+def report_side_by_side(lines1, lines2, opcodes):
+    """
+    Prints a side-by-side report in the style of `diff --side-by-side`,
+    bounded to the lines around the first difference.
+    """
+    rows = []
+    center = None
+    for tag, i1, i2, j1, j2 in opcodes:
+        left = [line for _, line, _ in lines1[i1:i2]]
+        right = [line for _, line, _ in lines2[j1:j2]]
+        if tag != 'equal' and center is None:
+            center = len(rows)
+        for k in range(max(len(left), len(right))):
+            lhs = left[k] if k < len(left) else ''
+            rhs = right[k] if k < len(right) else ''
+            if tag == 'equal':
+                gutter, color = ' ', RESET
+            elif k >= len(right):
+                gutter, color = '<', RED
+            elif k >= len(left):
+                gutter, color = '>', RED
+            else:
+                gutter, color = '|', RED
+            rows.append((f'{lhs[:DIFF_COLUMN_WIDTH]:<{DIFF_COLUMN_WIDTH}} {gutter} {rhs}', color))
+    report_rows(rows, center or 0)
+    return
+
+def report_unified(lines1, lines2, name1, name2, matcher):
+    """
+    Prints a report in the style of `diff --unified`, bounded to the first
+    EXCERPT_LINES lines.
+    """
+    rows = [(f'--- {name1}', RESET), (f'+++ {name2}', RESET)]
+    for group in matcher.get_grouped_opcodes(3):
+        i1, j1 = group[0][1], group[0][3]
+        i2, j2 = group[-1][2], group[-1][4]
+        start1 = lines1[i1][0] if i1 < len(lines1) else 0
+        start2 = lines2[j1][0] if j1 < len(lines2) else 0
+        rows.append((f'@@ -{start1},{i2 - i1} +{start2},{j2 - j1} @@', BLUE))
+        for tag, a1, a2, b1, b2 in group:
+            if tag == 'equal':
+                rows += [(f' {line}', RESET) for _, line, _ in lines1[a1:a2]]
+                continue
+            rows += [(f'-{line}', RED) for _, line, _ in lines1[a1:a2]]
+            rows += [(f'+{line}', GREEN) for _, line, _ in lines2[b1:b2]]
+    report_rows(rows)
+    return
+
+def first_mismatch(keys1, keys2):
+    """
+    Returns the index of the first differing line, or None if the lines match.
+    """
+    for index, (key1, key2) in enumerate(zip(keys1, keys2)):
+        if key1 != key2:
+            return index
+    if len(keys1) != len(keys2):
+        return min(len(keys1), len(keys2))
+    return None
+
+def mismatch_line(label, name, lines, index):
+    """
+    Returns 'label name:line: text' for lines[index], or an end of file marker.
+    """
+    if index < len(lines):
+        number, line, _ = lines[index]
+        return f'{label} {name}:{number}: {line}'
+    return f'{label} {name}: <end of file>'
+
+@profiled('diff')
+def text_diff(text1, text2, name1, name2, args=None):
+    """
+    Compare two texts ignoring case, blank lines and changes in the amount
+    of whitespace, without running an external diff.
+
+    Args:
+        text1 (str): The expected text.
+        text2 (str): The actual text.
+        name1 (str): Name used for the expected text in messages.
+        name2 (str): Name used for the actual text in messages.
+        args (argparse.Namespace, optional): Additional arguments. Defaults to None.
+
+    Returns:
+        int: 0 if the texts match, 1 otherwise (same as diff).
+    """
+    lines1 = normalize_lines(text1)
+    lines2 = normalize_lines(text2)
+    keys1 = [key for _, _, key in lines1]
+    keys2 = [key for _, _, key in lines2]
+
+    # stops at the first mismatch; that is all that is needed without a report
+    mismatch = first_mismatch(keys1, keys2)
+    rc = 0 if mismatch is None else 1
+    if rc != 0:
+        record_failure(args, 'diff mismatch', f'{name2} differs from {name1}',
+                       [mismatch_line('expected', name1, lines1, mismatch),
+                        mismatch_line('actual', name2, lines2, mismatch)])
+    if not args.verbose:
+        return rc
+
+    print(f'{GREEN}[==========]{RESET}')
+    print(f'{GREEN}[ COMPARE  ] {name1} {name2}{RESET}')
+    print(f'{GREEN}[==========]{RESET}')
+
+    matcher = difflib.SequenceMatcher(None, keys1, keys2, autojunk=False)
+    if getattr(args, 'unified', False):
+        if rc != 0:
+            report_unified(lines1, lines2, name1, name2, matcher)
+    else:
+        report_side_by_side(lines1, lines2, matcher.get_opcodes())
+
+    report_rc(rc)
+    return rc
+
+@profiled('file_diff')
 def file_diff(file1, file2, diff_args=None, args=None):
     """
     Compare two files and return the difference.
@@ -183,20 +1034,118 @@ def file_diff(file1, file2, diff_args=None, args=None):
     Args:
         file1 (str): Path to the first file.
         file2 (str): Path to the second file.
-        diff_args (str, optional): Additional arguments for the diff command. Defaults to None.
+        diff_args (str, optional): Arguments for an external diff command. Defaults to None,
+            which compares the files with text_diff instead.
         args (str, optional): Additional arguments for the execute_command function. Defaults to None.
 
     Returns:
-        int: Return code of the execute_command function.
+        int: 0 if the files match, 1 if they differ, 2 if a file cannot be read.
     """
-    diffcmd = 'diff'
-    if not diff_args:
-        # diff_args = '--ignore-case --ignore-blank-lines --side-by-side  --ignore-space-change  --suppress-common-lines --color=always'
-        diff_args = '--ignore-case --ignore-blank-lines --side-by-side  --ignore-space-change --color=always'
-    cmd = f'{diffcmd} {diff_args} {file1} {file2}'
-    rc = execute_command(cmd, args)
-    return rc
+    if diff_args:
+        cmd = f'diff {diff_args} {file1} {file2}'
+        rc = execute_command(cmd, args)
+        return rc
+
+    if args.debug:
+        return 0
+
+    try:
+        with open(file1, 'r') as f:
+            text1 = f.read()
+        with open(file2, 'r') as f:
+            text2 = f.read()
+    except OSError as e:
+        report_failure(f'Unable to compare {file1} {file2}: {e.strerror}')
+        return 2
+    return text_diff(text1, text2, file1, file2, args)
+
+@profiled('output_diff')
+def output_diff(file, output, name, diff_args=None, args=None):
+    """
+    Compare a file with captured program output and return the difference.
+
+    Args:
+        file (str): Path to the expected file.
+        output (str): The captured program output.
+        name (str): Name used for the output in messages.
+        diff_args (str, optional): Arguments for an external diff command. Defaults to None,
+            which compares with text_diff instead.
+        args (argparse.Namespace, optional): Additional arguments. Defaults to None.
 
+    Returns:
+        int: 0 if the file matches the output, 1 if they differ, 2 if the file cannot be read.
+    """
+    if diff_args:
+        cmd = ['diff'] + diff_args.split() + [file, '-']
+        if args.verbose:
+            print(f'{GREEN}[==========]{RESET}')
+            print(f'{GREEN}[ EXECUTE  ] {" ".join(cmd[:-1])} {name}{RESET}')
+            print(f'{GREEN}[==========]{RESET}')
+        rc = 0
+        if not args.debug:
+            rc, _ = run_process(cmd, args, test_input=output)
+        if args.verbose:
+            report_rc(rc)
+        return rc
+
+    if args.debug:
+        return 0
+
+    try:
+        with open(file, 'r') as f:
+            text = f.read()
+    except OSError as e:
+        report_failure(f'Unable to compare {file} {name}: {e.strerror}')
+        return 2
+    return text_diff(text, output, file, name, args)
+
+@contextlib.contextmanager
+def mapped_file(file):
+    """
+    Yields the contents of a file as a read-only memory map (bytes-like),
+    so a large output file is searched without being read into memory.
+    """
+    with open(file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+def mapped_head(data):
+    """
+    Returns the text of the start of a mapped file, enough for an excerpt.
+    """
+    return data[:EXCERPT_LINES * (EXCERPT_LINE_WIDTH + 1)].decode(errors='replace')
+
+def report_contains(found, name, description, expected, actual, failure, args):
+    """
+    Reports whether an expected string, regex or file was found in an output.
+
+    Args:
+        found (bool): Whether it was found.
+        name (str): Name used for the output in messages.
+        description (str): How the expectation is named in messages.
+        expected (str): The expectation, printed on failure.
+        actual (str): The output (or an excerpt of it), if not found.
+        failure (str): The failure class recorded if not found.
+        args (argparse.Namespace): Command-line arguments.
+
+    Returns:
+        int: 0 if found, 1 otherwise.
+    """
+    if found:
+        if args.verbose:
+            report_success(f'{description} found in {name}')
+        return 0
+    record_failure(args, failure, f'{description} not found in {name}', actual.splitlines()[:MISMATCH_LINES])
+    if args.verbose:
+        report_failure(f'{description} not found in {name}')
+        report_info(f'\nExpected:\n{expected}')
+        report_info(f'\nActual:\n{excerpt(actual)}')
+    return 1
+
+@profiled('file_contains')
 def file_contains_file(file, searchfile, args=None):
     """
     Check if a file contains another file.
@@ -209,28 +1158,39 @@ def file_contains_file(file, searchfile, args=None):
     Returns:
         int: 0 if the searchfile is found in the file, 1 otherwise.
     """
+    with open(searchfile, 'rb') as f:
+        searchdata = f.read()
+    with mapped_file(file) as filedata:
+        found = filedata.find(searchdata) >= 0
+        actual = None if found else mapped_head(filedata)
+    return report_contains(found, file, searchfile, searchdata.decode(errors='replace'),
+                           actual, 'missing output', args)
+
+@profiled('match')
+def output_contains_file(output, name, searchfile, args=None):
+    """
+    Check if captured program output contains a file.
+
+    Args:
+        output (str): The captured program output.
+        name (str): Name used for the output in messages.
+        searchfile (str): The path to the file to search for.
+        args (argparse.Namespace, optional): Additional arguments. Defaults to None.
+
+    Returns:
+        int: 0 if the searchfile is found in the output, 1 otherwise.
+    """
     if not args:
         args.verbose = False
         args.debug = False
 
-#    if args.verbose:
-#        report_info(f'Check file {file} contains file {searchfile}')
-
-    with open(file, 'r') as f:
-        filedata = f.read()
     with open(searchfile, 'r') as f:
         searchdata = f.read()
-    if searchdata in filedata:
-        if args.verbose:
-            report_success(f'{searchfile} found in {file}')
-        return 0
-    else:
-        if args.verbose:
-            report_failure(f'{searchfile} not found in {file}')
-            report_info(f'\nExpected:\n{searchdata}')
-            report_info(f'\nActual:\n{filedata}')
-        return 1
+    found = searchdata in output
+    return report_contains(found, name, searchfile, searchdata,
+                           None if found else output, 'missing output', args)
 
+@profiled('file_contains')
 def file_contains_string(file, searchstring, args=None):
     """
     Check if a file contains a specific string.
@@ -243,26 +1203,34 @@ def file_contains_string(file, searchstring, args=None):
     Returns:
         int: 0 if the searchstring is found in the file, 1 otherwise.
     """
-    if not args:
-        args.verbose = False
-        args.debug = False
+    with mapped_file(file) as filedata:
+        found = filedata.find(searchstring.encode()) >= 0
+        actual = None if found else mapped_head(filedata)
+    return report_contains(found, file, f'"{searchstring}"', searchstring, actual, 'missing output', args)
 
-#    if args.verbose:
-#        report_info(f'Check file {file} contains "{searchstring}"')
+@profiled('match')
+def output_contains_string(output, name, searchstring, args=None):
+    """
+    Check if captured program output contains a specific string.
 
-    with open(file, 'r') as f:
-        filedata = f.read()
-    if searchstring in filedata:
-        if args.verbose:
-            report_success(f'{searchstring} found in {file}')
-        return 0
-    else:
-        if args.verbose:
-            report_failure(f'"{searchstring}" not found in {file}')
-            report_info(f'\nExpected:\n{searchstring}')
-            report_info(f'\nActual:\n{filedata}')
-        return 1
+    Args:
+        output (str): The captured program output.
+        name (str): Name used for the output in messages.
+        searchstring (str): The string to search for in the output.
+        args (argparse.Namespace, optional): Additional arguments. Defaults to None.
+
+    Returns:
+        int: 0 if the searchstring is found in the output, 1 otherwise.
+    """
+    if not args:
+        args.verbose = False
+        args.debug = False
+
+    found = searchstring in output
+    return report_contains(found, name, f'"{searchstring}"', searchstring,
+                           None if found else output, 'missing output', args)
 
+@profiled('file_contains')
 def file_contains_regex(file, searchstring, args=None):
     """
     Check if a file contains a specific string using regular expression.
@@ -275,27 +1243,176 @@ def file_contains_regex(file, searchstring, args=None):
     Returns:
         int: 0 if the searchstring is found in the file, 1 otherwise.
     """
+    with mapped_file(file) as filedata:
+        found = compile_pattern(searchstring.encode()).search(filedata) is not None
+        actual = None if found else mapped_head(filedata)
+    return report_contains(found, file, f'Regex "{searchstring}"', f'Regex {searchstring}',
+                           actual, 'regex miss', args)
+
+@profiled('match')
+def output_contains_regex(output, name, searchstring, args=None):
+    """
+    Check if captured program output contains a specific string using regular expression.
+
+    Args:
+        output (str): The captured program output.
+        name (str): Name used for the output in messages.
+        searchstring (str): The string to search for in the output.
+        args (argparse.Namespace, optional): Additional arguments. Defaults to None.
+
+    Returns:
+        int: 0 if the searchstring is found in the output, 1 otherwise.
+    """
     if not args:
         args.verbose = False
         args.debug = False
 
-#    if args.verbose:
-#        report_info(f'Check file {file} contains regex "{searchstring}"')
+    found = compile_pattern(searchstring).search(output) is not None
+    return report_contains(found, name, f'Regex "{searchstring}"', f'Regex {searchstring}',
+                           None if found else output, 'regex miss', args)
 
-    with open(file, 'r') as f:
-        filedata = f.read()
-    if re.search(searchstring, filedata):
-        if args.verbose:
-            report_success(f'Regex "{searchstring}" found in {file}')
-        return 0
-    else:
+@functools.lru_cache(maxsize=None)
+def compile_pattern(pattern):
+    """
+    Returns the compiled regular expression for a pattern, compiling each
+    distinct pattern once.
+    """
+    return re.compile(pattern)
+
+def movie_response(movie, response):
+    """
+    Returns a regex matching the program's response to a command on a movie,
+    e.g. movie_response('Black Panther', 'found').  The title is escaped.
+    """
+    return rf'{re.escape(movie)}\s+{response}'
+
+def read_expected_file(file):
+    """
+    Returns the contents of an expected (AutoTest_*) file, reading each
+    version of the file once.
+    """
+    st = os.stat(file)
+    return _read_expected_file(os.path.abspath(file), st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=64)
+def _read_expected_file(path, mtime_ns, size):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+class Expectations:
+    """
+    A batch of expectations about one program output, checked together.
+
+    Add expectations with contains(), regex(), contains_file() and
+    sequence(), then call check() once: the substring and regex
+    expectations are matched in a single scan of the output, and every
+    unmet expectation is reported, not just the first.
+
+    Example:
+        expect = Expectations(output, test_output_file)
+        for movie in ADD_MOVIES:
+            expect.regex(movie_response(movie, 'added'))
+        rc = expect.check(args)
+    """
+
+    def __init__(self, output, name):
+        """
+        Args:
+            output (str): The captured program output.
+            name (str): Name used for the output in messages.
+        """
+        self.output = output
+        self.name = name
+        self.expectations = []
+
+    def contains(self, text):
+        """Expect a substring."""
+        self.expectations.append(('string', f'"{text}"', re.escape(text)))
+        return self
+
+    def regex(self, pattern):
+        """Expect a match of a regular expression."""
+        self.expectations.append(('regex', f'Regex "{pattern}"', pattern))
+        return self
+
+    def contains_file(self, file):
+        """Expect the contents of a file as a substring."""
+        self.expectations.append(('file', file, re.escape(read_expected_file(file))))
+        return self
+
+    def sequence(self, patterns):
+        """Expect matches of several regular expressions, in order."""
+        self.expectations.append(('sequence', f'Sequence {patterns}', list(patterns)))
+        return self
+
+    def scan(self):
+        """
+        Returns the set of indexes of the unordered expectations found by one
+        pass over the output with all their patterns combined.
+        """
+        unordered = [(i, pattern) for i, (kind, _, pattern) in enumerate(self.expectations)
+                     if kind != 'sequence']
+        if not unordered:
+            return set()
+        combined = '|'.join(f'(?P<e{i}>{pattern})' for i, pattern in unordered)
+        try:
+            scanner = compile_pattern(combined)
+        except re.error:
+            return set()
+        found = set()
+        for match in scanner.finditer(self.output):
+            found.add(int(match.lastgroup[1:]))
+            if len(found) == len(unordered):
+                break
+        return found
+
+    def met(self, index, found):
+        """
+        Returns True if expectation index is met.  Expectations the combined
+        scan did not see (e.g. overlapping another match) are searched alone.
+        """
+        kind, _, pattern = self.expectations[index]
+        if kind == 'sequence':
+            position = 0
+            for step in pattern:
+                match = compile_pattern(step).search(self.output, position)
+                if not match:
+                    return False
+                position = match.end()
+            return True
+        return index in found or compile_pattern(pattern).search(self.output) is not None
+
+    @profiled('match')
+    def check(self, args):
+        """
+        Checks every expectation and reports the results.
+
+        Returns:
+            int: 0 if all expectations are met, 1 otherwise.
+        """
+        found = self.scan()
+        unmet = []
+        for index, (kind, description, _) in enumerate(self.expectations):
+            if self.met(index, found):
+                if args.verbose:
+                    report_success(f'{description} found in {self.name}')
+            else:
+                unmet.append((kind, description))
+                if args.verbose:
+                    report_failure(f'{description} not found in {self.name}')
+
+        if not unmet:
+            return 0
+        failure = 'missing output' if unmet[0][0] in ('string', 'file') else 'regex miss'
+        record_failure(args, failure,
+                       f'{len(unmet)} of {len(self.expectations)} expectations not found in {self.name}',
+                       [description for _, description in unmet] +
+                       self.output.splitlines()[:MISMATCH_LINES])
         if args.verbose:
-            report_failure(f'Regex "{searchstring}" not found in {file}')
-            report_info(f'\nExpected:\nRegex {searchstring}')
-            report_info(f'\nActual:\n{filedata}')
+            report_info(f'\nActual:\n{excerpt(self.output)}')
         return 1
 
-import shutil
 
 def file_copy(src, dest, args=None):
     """
@@ -316,6 +1433,29 @@ def file_copy(src, dest, args=None):
         return 1
     return 0
 
+def stage_input_file(src, dest, args=None):
+    """
+    Stage a test input file: dest is left alone if it still has the content
+    of src, otherwise it is reflinked or copied (see
+    AutoTest_Cache.stage_file).
+
+    Args:
+        src (str): The path of the pristine (AutoTest) file.
+        dest (str): The path the program reads.
+        args (optional): Command-line arguments; debug reports how dest was staged.
+
+    Returns:
+        int: 0 if dest has the content of src, 1 otherwise.
+    """
+    try:
+        how = AutoTest_Cache.stage_file(src, dest)
+    except OSError:
+        report_failure(f'Unable to stage {src} as {dest}')
+        return 1
+    if args and args.debug:
+        report_info(f'[ STAGE    ] {dest} ({how})')
+    return 0
+
 def file_exists(file, args=None):
     return os.path.exists(file)
 
@@ -324,10 +1464,11 @@ def file_remove(file, args=None):
         os.remove(file)
     return
 
+@profiled('copy_test_input_files')
 def copy_test_input_files():
     # make sure the data files exist; overwrite if necessary
     for file, testfile in zip(DATAFILES, TESTDATAFILES):
-        rc = file_copy(os.path.join(DATA_DIR, testfile), file)
+        rc = stage_input_file(os.path.join(DATA_DIR, testfile), file)
         if rc != 0:
             return rc
     return 0
@@ -384,39 +1525,71 @@ def cleanup(args):
     return
 
 
-def test_missing_file(args):
-    """
-    Test case for checking if a file is missing.
-
-    Args:
-        args: Additional arguments for executing the command.
-
-    Returns:
-        int: Return code indicating the result of the test case.
-    """
-    # make sure the data files do NOT exist
-    for file in DATAFILES:
-        if os.path.exists(file):
-            os.remove(file)
-
-    # run the program
-    cmd = f'{EXECUTABLE} > {STUDENT_MAIN_MISSING_FILE} 2>&1'
-    rc = execute_command(cmd, args)
-
-    autotest_file = os.path.join(DATA_DIR, AUTOTEST_MAIN_MISSING_FILE)
-
-    if not file_exists(autotest_file):
-        report_failure(f'{autotest_file} not found')
-        return 1
-
-    # check that the updated movie queue file contains the new movie
-    rc = file_diff(autotest_file, STUDENT_MAIN_MISSING_FILE, args=args)
-    return rc
-
-
-def test_exit(args):
+#--------------------------------------------------------------------------
+# Test specifications - a test is data: the commands sent to stdin, the
+# data files staged for the program and the checks on what it produced.
+#
+# 'commands' - (user command, movie) or (user command,) tuples, in order
+# 'inputs'   - (AutoTest file, student file) pairs staged before the run;
+#              defaults to TESTDATAFILES copied to DATAFILES
+# 'output'   - name of the output file (written only with --savefiles)
+# 'accept_rc'- acceptable return codes; defaults to [0]
+# 'expect'   - (kind, value) checks on the output: 'regex', 'string',
+#              'file' (contains the AutoTest file) or 'diff' (matches it)
+# 'queue'    - AutoTest file expected in STUDENT_MOVIE_QUEUE_UPDATE_FILE
+#
+# Tests with the same program, stdin and input files share one run (see
+# plan_runs); a test that needs more than this can still be a function.
+#--------------------------------------------------------------------------
+def movie_commands(user_cmd, movies):
+    return [(user_cmd, movie) for movie in movies]
+
+def movie_responses(movies, response):
+    return [('regex', movie_response(movie, response)) for movie in movies]
+
+EXIT = [('exit',)]
+
+TEST_SPECS = {
+    'test_missing_file': {'inputs': [], 'commands': [], 'accept_rc': [0, 1],
+                          'output': STUDENT_MAIN_MISSING_FILE,
+                          'expect': [('diff', AUTOTEST_MAIN_MISSING_FILE)]},
+    'test_exit': {'commands': EXIT, 'output': 'test_output_exit.txt'},
+    'test_search': {'commands': movie_commands('search', [SEARCH_MOVIE_FOUND]) + EXIT,
+                    'output': 'test_output_search_found.txt',
+                    'expect': movie_responses([SEARCH_MOVIE_FOUND], 'found')},
+    'test_search_not_found': {'commands': movie_commands('search', [SEARCH_MOVIE_NOT_FOUND]) + EXIT,
+                              'output': 'test_output_search_not_found.txt',
+                              'expect': movie_responses([SEARCH_MOVIE_NOT_FOUND], 'not found')},
+    'test_add': {'commands': movie_commands('add', ADD_MOVIES) + EXIT,
+                 'output': 'test_output_add.txt',
+                 'expect': movie_responses(ADD_MOVIES, 'added'),
+                 'queue': AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_ADDS},
+    'test_add_already_present': {'commands': movie_commands('add', [SEARCH_MOVIE_FOUND]) + EXIT,
+                                 'output': 'test_output_add_already_present.txt',
+                                 'expect': movie_responses([SEARCH_MOVIE_FOUND], 'already present'),
+                                 'queue': AUTOTEST_MOVIE_QUEUE_UPDATE_FILE},
+    'test_watch': {'commands': movie_commands('watch', DEL_MOVIES) + EXIT,
+                   'output': 'test_output_watch.txt',
+                   'expect': movie_responses(DEL_MOVIES, 'watched'),
+                   'queue': AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_DELS},
+    'test_delete': {'commands': movie_commands('delete', DEL_MOVIES) + EXIT,
+                    'output': 'test_output_delete.txt',
+                    'expect': movie_responses(DEL_MOVIES, 'removed'),
+                    'queue': AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_DELS},
+    'test_delete_not_found': {'commands': movie_commands('delete', [SEARCH_MOVIE_NOT_FOUND]) + EXIT,
+                              'output': 'test_output_delete_not_found.txt',
+                              'expect': movie_responses([SEARCH_MOVIE_NOT_FOUND], 'not found'),
+                              'queue': AUTOTEST_MOVIE_QUEUE_UPDATE_FILE},
+    'test_print': {'commands': [('print',)] + EXIT,
+                   'output': 'test_output_print.txt',
+                   'expect': [('file', AUTOTEST_MOVIE_QUEUE_UPDATE_FILE)]},
+}
+
+
+def test_interactive(args):
     """
-    Test the 'exit' functionality of the program.
+    Test every command in one interactive session, checking each response
+    as it arrives and stopping at the first wrong or missing one.
 
     Args:
         args: Additional arguments passed to the function.
@@ -428,396 +1601,519 @@ def test_exit(args):
         report_failure(f'Unable to copy test input files')
         return 1
 
-    user_cmd = 'exit'
+    # the queue after the adds and deletes, in the order print shows it
+    with open(os.path.join(DATA_DIR, AUTOTEST_MOVIE_QUEUE_FILE), 'r') as f:
+        queue = set(line.strip() for line in f if line.strip())
+    queue = sorted((queue | set(ADD_MOVIES)) - set(DEL_MOVIES))
 
-    # build the command sequence into a string
-    test_cmd = f'{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}.txt'
+    steps = [interactive_step('search', SEARCH_MOVIE_FOUND, 'found'),
+             interactive_step('search', SEARCH_MOVIE_NOT_FOUND, 'not found')]
+    steps += [interactive_step('add', movie, 'added') for movie in ADD_MOVIES]
+    steps += [interactive_step('add', SEARCH_MOVIE_FOUND, 'already present'),
+              interactive_step('watch', DEL_MOVIES[0], 'watched'),
+              interactive_step('delete', DEL_MOVIES[1], 'removed'),
+              interactive_step('delete', SEARCH_MOVIE_NOT_FOUND, 'not found'),
+              interactive_step('print', expect=r'\s+'.join(re.escape(movie) for movie in queue)),
+              interactive_step('exit')]
+
+    test_output_file = f'test_output_interactive.txt'
 
     # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)    
+    rc, output = execute_interactive(steps, test_output_file, args)
     return rc
 
 
-def test_search(args):
+#--------------------------------------------------------------------------
+# Planner - runs each distinct (binary, stdin, input files) once and fans
+# the captured result out to every TEST_SPECS test that needs it
+#--------------------------------------------------------------------------
+def spec_stdin(spec):
     """
-    Test the 'search' functionality of the program where movie found.
-
-    Args:
-        args: Additional arguments passed to the function.
-
-    Returns:
-        int: Return code indicating the success or failure of the test.
+    Returns the stdin text for the commands of a test spec.
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
-
-    user_cmd = 'search'
-
-    # build the command sequence into a string
-    movie = SEARCH_MOVIE_FOUND
-    test_cmd = f'{USER_COMMANDS[user_cmd]}\n{movie}\n{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}_found.txt'
-
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc
-    
-    search_str = f'{movie}\s+found'
-    rc = file_contains_regex(test_output_file, search_str, args=args)
-    return rc
+    return ''.join(''.join(f'{text}\n' for text in (USER_COMMANDS[command[0]],) + tuple(command[1:]))
+                   for command in spec['commands'])
 
+def spec_inputs(spec):
+    """
+    Returns the (source path, student file) pairs staged for a test spec.
+    """
+    inputs = spec.get('inputs', list(zip(TESTDATAFILES, DATAFILES)))
+    return [(os.path.join(DATA_DIR, src), dest) for src, dest in inputs]
 
-def test_search_not_found(args):
+def run_key(spec):
+    """
+    Returns the identity of the program run a test spec needs: the
+    executable, the stdin text and the contents of the staged files.
     """
-    Test the 'search' functionality when movie not found.
+    inputs = tuple((dest, AutoTest_Cache.file_hash(src)) for src, dest in spec_inputs(spec))
+    return (AutoTest_Cache.file_hash(EXECUTABLE), spec_stdin(spec), inputs)
 
-    Args:
-        args: Additional arguments passed to the function.
+def plan_runs(tests):
+    """
+    Groups tests by the program run they need, in the order of the tests.
+    A test that is a function rather than a spec is a group of its own.
 
     Returns:
-        int: Return code indicating the success or failure of the test.
+        list: Lists of test names; the tests in a list share one run.
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
-
-    user_cmd = 'search'
-
-    # build the command sequence into a string
-    movie = SEARCH_MOVIE_NOT_FOUND
-    test_cmd = f'{USER_COMMANDS[user_cmd]}\n{movie}\n{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}_not_found.txt'
-
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc
-    
-    search_str = f'{movie}\s+not found'
-    rc = file_contains_regex(test_output_file, search_str, args=args)
-    return rc
-
+    groups = {}
+    for test in tests:
+        key = run_key(TEST_SPECS[test]) if test in TEST_SPECS else test
+        groups.setdefault(key, []).append(test)
+    return list(groups.values())
 
-def test_add(args):
+def execute_run(spec, name, args):
     """
-    Test the 'add' functionality of the program.
+    Stages the input files of a test spec, runs EXECUTABLE and captures its
+    output and the updated movie queue file.
 
-    Args:
-        args: Additional arguments passed to the function.
+    Returns:
+        dict: 'rc', 'output', 'queue' (None if the program did not write it)
+        and 'alloc' (see counting_allocations), or None if the input files
+        could not be staged.
+    """
+    inputs = spec_inputs(spec)
+    for file in DATAFILES + [STUDENT_MOVIE_QUEUE_UPDATE_FILE]:
+        if file not in [dest for _, dest in inputs]:
+            file_remove(file)
+    for src, dest in inputs:
+        if stage_input_file(src, dest, args) != 0:
+            return None
+
+    input_file = f'test_input_{name[len("test_"):]}.txt' if spec['commands'] else None
+    rc, output = execute_program(spec_stdin(spec), input_file, spec.get('output'), args,
+                                 spec.get('accept_rc', [0]))
+    queue = None
+    if file_exists(STUDENT_MOVIE_QUEUE_UPDATE_FILE):
+        queue = read_bounded(STUDENT_MOVIE_QUEUE_UPDATE_FILE, output_limit(args))
+    return {'rc': rc, 'output': output, 'queue': queue, 'alloc': args.test_result.get('alloc')}
+
+def run_spec(test, args):
+    """
+    Runs a TEST_SPECS test: executes its program run unless an earlier test
+    of the same run of the tests already did (args.run_results, a dict set
+    up by test_main() for each run; without it every test runs its own),
+    then checks the captured result.
 
     Returns:
         int: Return code indicating the success or failure of the test.
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
-
-    user_cmd = 'add'
-
-    # build the command sequence into a string
-    test_cmd = ""
-    for movie in ADD_MOVIES:
-        test_cmd += f'{USER_COMMANDS[user_cmd]}\n{movie}\n'
-    test_cmd += f'{USER_COMMANDS["exit"]}\n'
-    # movie = ADD_MOVIE
-    # test_cmd = f'{USER_COMMANDS[user_cmd]}\n{movie}\n{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}.txt'
-
-    autotest_queue_file = os.path.join(DATA_DIR, AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_ADDS)
-
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc
-    
-    for movie in ADD_MOVIES:
-        search_str = f'{movie}\s+added'
-        rc = file_contains_regex(test_output_file, search_str, args=args)
+    spec = TEST_SPECS[test]
+    key = run_key(spec)
+    runs = getattr(args, 'run_results', None)
+    run = runs.get(key) if runs is not None else None
+    if run is None:
+        run = execute_run(spec, test, args)
+        if run is None:
+            report_failure(f'Unable to copy test input files')
+            return 1
+        # a run that timed out may not time out again
+        if runs is not None and not args.debug and run['rc'] != TIMEOUT_RC:
+            runs[key] = run
+    else:
+        if args.verbose:
+            report_info(f'[ REUSE    ] {EXECUTABLE} output of an identical earlier run', GREEN)
+            report_rc(run['rc'], spec.get('accept_rc', [0]))
+        record_rc(run['rc'], args, spec.get('accept_rc', [0]))
+        record_alloc(args, run.get('alloc'))
+    if run['rc'] not in spec.get('accept_rc', [0]):
+        return run['rc']
+
+    name = spec.get('output') or test
+    expect = Expectations(run['output'], name)
+    for kind, value in spec.get('expect', []):
+        if kind == 'regex':
+            expect.regex(value)
+        elif kind == 'string':
+            expect.contains(value)
+        elif kind == 'file':
+            expect.contains_file(os.path.join(DATA_DIR, value))
+    if expect.expectations:
+        rc = expect.check(args)
         if rc != 0:
             return rc
+    for kind, value in spec.get('expect', []):
+        if kind == 'diff':
+            rc = output_diff(os.path.join(DATA_DIR, value), run['output'], name, args=args)
+            if rc != 0:
+                return rc
 
-    # check that the updated movie queue file contains the new movie
-    rc = file_diff(autotest_queue_file, 
-                   STUDENT_MOVIE_QUEUE_UPDATE_FILE,
-                   args=args)
-    return rc
+    if 'queue' not in spec or args.debug:
+        return 0
+    autotest_queue_file = os.path.join(DATA_DIR, spec['queue'])
+    if args.verbose:
+        report_info(f'Checking {STUDENT_MOVIE_QUEUE_UPDATE_FILE}')
+    if run['queue'] is None:
+        report_failure(f'{STUDENT_MOVIE_QUEUE_UPDATE_FILE} not written')
+        record_failure(args, 'missing output', f'{STUDENT_MOVIE_QUEUE_UPDATE_FILE} not written')
+        return 2
+    return text_diff(read_expected_file(autotest_queue_file), run['queue'],
+                     autotest_queue_file, STUDENT_MOVIE_QUEUE_UPDATE_FILE, args)
 
 
-def test_add_already_present(args):
+#--------------------------------------------------------------------------
+# Test runner - runs the tests by name, alone, in sandboxes or in
+# parallel, and reports and records their results
+#--------------------------------------------------------------------------
+def run_test(test, args):
     """
-    Test the 'add' functionality if movie already present
+    Runs a single test function by name between its banner and footer,
+    replaying the stored result instead if the result cache has one.
 
     Args:
-        args: Additional arguments passed to the function.
+        test (str): The name of the test function to run.
+        args: Command-line arguments.
 
     Returns:
-        int: Return code indicating the success or failure of the test.
+        int: Return code of the test function; the details are left in
+        args.test_result (see new_result).
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
-
-    user_cmd = 'add'
+    key = None
+    if getattr(args, 'result_cache', None) and not args.debug:
+        key = AutoTest_Cache.cache_key(test, AutoTest_Cache.file_hash(EXECUTABLE),
+                                       AutoTest_Cache.data_files_hash(DATA_DIR),
+                                       args.verbose, getattr(args, 'unified', False), output_limit(args),
+                                       bool(getattr(args, 'alloc_shim', None)))
+    global PROFILE_TEST
+    PROFILE_TEST = test
+    args.test_result = new_result(test)
+    start = time.monotonic()
+    with profile_span('test'):
+        rc = run_cached(key, lambda: run_test_function(test, args), args)
+    finish_result(args.test_result, rc, time.monotonic() - start)
+    PROFILE_TEST = None
+    return rc
 
-    # build the command sequence into a string
-    movie = SEARCH_MOVIE_FOUND
-    test_cmd = f'{USER_COMMANDS[user_cmd]}\n{movie}\n{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}.txt'
+def new_result(name):
+    """
+    Returns an empty result record for a test.
+    """
+    return {'name': name, 'rc': None, 'failure': None, 'message': '',
+            'duration': 0.0, 'mismatch': [], 'usage': None, 'alloc': None}
 
-    autotest_queue_file = os.path.join(DATA_DIR, AUTOTEST_MOVIE_QUEUE_UPDATE_FILE)
+def finish_result(result, rc, duration):
+    """
+    Fills in the rc and duration of a result record, classifying failures
+    that were not recorded by a check (e.g. a crash) by their rc.
+    """
+    result['rc'] = rc
+    result['duration'] = round(duration, 6)
+    if rc == 0:
+        result['failure'] = None
+    elif not result['failure']:
+        result['failure'] = FAILURE_CLASSES.get(rc, 'rc')
+        result['message'] = f'rc = {rc}'
+    return
 
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc
-    
-    search_str = f'{movie}\s+already present'
-    rc = file_contains_regex(test_output_file, search_str, args=args)
-    if rc != 0:
-        return rc
+def find_test(test):
+    """
+    Returns the function that runs a test by name (called with args): a
+    TEST_SPECS test or a test_* function of args (not test_main), or None
+    if there is no such test.
+    """
+    if test in TEST_SPECS:
+        return functools.partial(run_spec, test)
+    func = globals().get(test)
+    if not test.startswith('test_') or not callable(func):
+        return None
+    try:
+        parameters = list(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        return None
+    return func if parameters == ['args'] else None
 
-    # check that the updated movie queue file does not change
-    rc = file_diff(autotest_queue_file, 
-                   STUDENT_MOVIE_QUEUE_UPDATE_FILE,
-                   args=args)
+def run_test_function(test, args):
+    """
+    Runs a single test function by name between its banner and footer.
+    An unknown test and a test that raises an exception fail.
+    """
+    banner(test, args)
+    timeout = TEST_TIMEOUTS.get(test, args.timeout)
+    args.test_deadline = time.monotonic() + timeout if timeout else None
+    func = find_test(test)
+    if func is None:
+        report_failure(f'Test function {test} not found.')
+        record_failure(args, 'not found', f'no test named {test}')
+        rc = 1
+    else:
+        try:
+            rc = func(args)
+        except Exception as e:
+            report_failure(f'{test} raised {type(e).__name__}: {e}')
+            record_failure(args, 'error', f'{type(e).__name__}: {e}')
+            rc = 1
+    footer(test, rc, args)
     return rc
 
-
-def test_watch(args):
+def run_cached(key, func, args):
     """
-    Test the 'watch' functionality of the program.
+    Runs func() and returns its rc.  With a cache key, a cached result is
+    printed and returned without running func; otherwise func's output is
+    captured and stored with its rc (unless it timed out, which may not
+    happen again).
 
     Args:
-        args: Additional arguments passed to the function.
+        key (str): The result cache key, or None to just run func.
+        func (callable): Runs the test and returns its rc.
+        args: Command-line arguments (args.result_cache is the cache directory).
 
     Returns:
-        int: Return code indicating the success or failure of the test.
+        int: The return code.
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
-
-    user_cmd = 'watch'
-
-    # build the command sequence into a string
-    test_cmd = ""
-    for movie in DEL_MOVIES:
-        test_cmd += f'{USER_COMMANDS[user_cmd]}\n{movie}\n'
-    test_cmd += f'{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}.txt'
-
-    autotest_queue_file = os.path.join(DATA_DIR, AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_DELS)
-
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc 
-
-    for movie in DEL_MOVIES:
-        search_str = f'{movie}\s+watched'
-        rc = file_contains_regex(test_output_file, search_str, args=args)
-        if rc != 0:
-            return rc
-        
-    # check that the updated movie queue file does not contain watched movies
-    if args.verbose:
-        report_info(f'Checking watched movies {DEL_MOVIES} removed')
-
-    rc = file_diff(autotest_queue_file, 
-                   STUDENT_MOVIE_QUEUE_UPDATE_FILE,
-                   args=args)
-    if rc != 0:
-        if args.verbose:
-            report_failure(f'{DEL_MOVIES} not removed from {STUDENT_MOVIE_QUEUE_UPDATE_FILE}')
-        return rc 
-
+    if not key:
+        return func()
+
+    cached = AutoTest_Cache.cache_get(args.result_cache, key)
+    if cached:
+        sys.stdout.write(cached['output'])
+        sys.stdout.flush()
+        if getattr(args, 'test_result', None) is not None and cached.get('result'):
+            args.test_result.update(cached['result'])
+        return cached['rc']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, 'output.log')
+        with capture_output(log_file):
+            rc = func()
+        with open(log_file, 'r', errors='replace') as f:
+            output = f.read()
+    sys.stdout.write(output)
+    sys.stdout.flush()
+    if rc != TIMEOUT_RC:
+        entry = {'rc': rc, 'output': output}
+        if getattr(args, 'test_result', None) is not None:
+            entry['result'] = {k: args.test_result[k] for k in ('failure', 'message', 'mismatch', 'usage', 'alloc')}
+        AutoTest_Cache.cache_put(args.result_cache, key, entry)
     return rc
 
+@contextlib.contextmanager
+def capture_output(log_file):
+    """
+    Redirects stdout/stderr to a file at the file descriptor level, so the
+    output of child processes is captured too.
 
-def test_delete(args):
+    Args:
+        log_file (str): Path of the file to write the output to.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = (os.dup(1), os.dup(2))
+    with open(log_file, 'w') as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            os.close(saved_fds[0])
+            os.close(saved_fds[1])
+
+def stage_sandbox(test, build_dir):
     """
-    Test the 'delete' functionality of the program.
+    Creates an empty scratch directory for a test and stages the executable
+    and the student data files into it.
 
     Args:
-        args: Additional arguments passed to the function.
+        test (str): The name of the test the sandbox is for.
+        build_dir (str): Absolute path of the build directory.
 
     Returns:
-        int: Return code indicating the success or failure of the test.
+        str: Absolute path of the sandbox directory.
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
+    sandbox = os.path.join(build_dir, SANDBOX_DIR, test)
+    shutil.rmtree(sandbox, ignore_errors=True)
+    os.makedirs(sandbox)
 
-    user_cmd = 'delete'
-
-    test_cmd = ""
-    for movie in DEL_MOVIES:
-        test_cmd += f'{USER_COMMANDS[user_cmd]}\n{movie}\n'
-    test_cmd += f'{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}.txt'
-
-    autotest_queue_file = os.path.join(DATA_DIR, AUTOTEST_MOVIE_QUEUE_UPDATE_FILE_DELS)
-
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc 
-
-    for movie in DEL_MOVIES:
-        search_str = f'{movie}\s+removed'
-        rc = file_contains_regex(test_output_file, search_str, args=args)
-        if rc != 0:
-            return rc
-        
-    # check that the updated movie queue file does not contain deleted movies
-    if args.verbose:
-        report_info(f'Checking {DEL_MOVIES} deleted from updated queue')
-
-    rc = file_diff(autotest_queue_file, 
-                STUDENT_MOVIE_QUEUE_UPDATE_FILE,
-                args=args)
-    if rc != 0:
-        if args.verbose:
-            report_failure(f'{DEL_MOVIES} not removed from {STUDENT_MOVIE_QUEUE_UPDATE_FILE}')
-        return rc 
-     
-    return rc
+    executable = os.path.join(build_dir, EXECUTABLE)
+    staged = os.path.join(sandbox, os.path.basename(EXECUTABLE))
+    try:
+        os.symlink(executable, staged)
+    except OSError:
+        shutil.copy2(executable, staged)
 
+    for file in DATAFILES:
+        if file_exists(os.path.join(build_dir, file)):
+            stage_input_file(os.path.join(build_dir, file), os.path.join(sandbox, file))
+    return sandbox
 
-def test_delete_not_found(args):
+def run_test_in_sandbox(test, args, build_dir):
     """
-    Test the 'delete' functionality when movie not found.
+    Runs a single test inside its own sandbox, capturing everything written
+    to stdout/stderr (including child processes) so the caller can print it
+    in order.
 
     Args:
-        args: Additional arguments passed to the function.
+        test (str): The name of the test function to run.
+        args: Command-line arguments.
+        build_dir (str): Absolute path of the build directory.
 
     Returns:
-        int: Return code indicating the success or failure of the test.
+        tuple: (rc, captured output, result record, profile events)
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
-
-    user_cmd = 'delete'
+    global DATA_DIR, PROFILING
+    DATA_DIR = os.path.abspath(os.path.join(build_dir, DATA_DIR))
+    PROFILING = bool(args.profile)
+    del PROFILE_EVENTS[:]
+
+    sandbox = stage_sandbox(test, build_dir)
+    os.chdir(sandbox)
+
+    log_file = os.path.join(sandbox, f'{SANDBOX_DIR}.log')
+    with capture_output(log_file):
+        rc = run_test(test, args)
+    with open(log_file, 'r') as f:
+        output = f.read()
+    os.chdir(build_dir)
+    return rc, output, args.test_result, list(PROFILE_EVENTS)
+
+def run_group_in_sandbox(group, args, build_dir):
+    """
+    Runs tests that share one program run (see plan_runs) in one worker,
+    so the run is executed once.
 
-    movie = SEARCH_MOVIE_NOT_FOUND
-    test_cmd = ""
-    test_cmd += f'{USER_COMMANDS[user_cmd]}\n{movie}\n'
-    test_cmd += f'{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}.txt'
+    Returns:
+        dict: The run_test_in_sandbox results of each test in the group.
+    """
+    return {test: run_test_in_sandbox(test, args, build_dir) for test in group}
 
-    autotest_queue_file = os.path.join(DATA_DIR, AUTOTEST_MOVIE_QUEUE_UPDATE_FILE)
+def run_tests_parallel(tests, args):
+    """
+    Runs tests on a process pool, each in its own sandbox, and prints their
+    output in the order the tests were given.  Tests that share a program
+    run go to the same worker.
 
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc 
+    Args:
+        tests (list): The names of the test functions to run.
+        args: Command-line arguments.
 
-    search_str = f'{movie}\s+not found'
-    rc = file_contains_regex(test_output_file, search_str, args=args)
-    if rc != 0:
-        return rc
-        
-    # check that the updated movie queue file does not contain deleted movies
-    if args.verbose:
-        report_info(f'Checking movie list unchanged')
+    Returns:
+        list: The result record of each test, in the order given.
+    """
+    build_dir = os.getcwd()
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {}
+        for group in plan_runs(tests):
+            future = pool.submit(run_group_in_sandbox, group, args, build_dir)
+            futures.update((test, future) for test in group)
+        for test in tests:
+            rc, output, result, events = futures[test].result()[test]
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            results.append(result)
+            PROFILE_EVENTS.extend(events)
+    return results
+
+def write_json_results(results, rc, json_file):
+    """
+    Writes the result records of a run to a JSON file.
+    """
+    passed = sum(1 for result in results if result['rc'] == 0)
+    with open(json_file, 'w') as f:
+        json.dump({'tests': results, 'passed': passed,
+                   'failed': len(results) - passed, 'rc': rc}, f, indent=2)
+    return
 
-    rc = file_diff(autotest_queue_file, 
-                   STUDENT_MOVIE_QUEUE_UPDATE_FILE, 
-                   args=args)
-    if rc != 0:
-        if args.verbose:
-            report_failure(f'[  FAILED  ] {STUDENT_MOVIE_QUEUE_UPDATE_FILE} is incorrect')
-        return rc 
-     
-    return rc
+def write_junit_results(results, junit_file, suite=PROJECT):
+    """
+    Writes the result records of a run to a JUnit XML file.
+    """
+    failures = sum(1 for result in results if result['rc'] != 0)
+    duration = sum(result['duration'] for result in results)
+    testsuites = ET.Element('testsuites')
+    testsuite = ET.SubElement(testsuites, 'testsuite', name=suite, tests=str(len(results)),
+                              failures=str(failures), errors='0', time=f'{duration:.6f}')
+    for result in results:
+        testcase = ET.SubElement(testsuite, 'testcase', classname=suite,
+                                 name=result['name'], time=f'{result["duration"]:.6f}')
+        if result['rc'] != 0:
+            failure = ET.SubElement(testcase, 'failure', type=result['failure'] or 'rc',
+                                    message=result['message'])
+            failure.text = '\n'.join([f'rc = {result["rc"]}'] + result['mismatch'])
+    ET.ElementTree(testsuites).write(junit_file, encoding='utf-8', xml_declaration=True)
+    return
 
+def write_profile(profile_file):
+    """
+    Writes the recorded profile events as a Chrome trace (chrome://tracing,
+    https://ui.perfetto.dev) and prints the phases with the most total time.
+    """
+    with open(profile_file, 'w') as f:
+        json.dump({'traceEvents': PROFILE_EVENTS, 'displayTimeUnit': 'ms'}, f)
+
+    phases = {}
+    for event in PROFILE_EVENTS:
+        count, total, longest = phases.get(event['name'], (0, 0.0, 0.0))
+        phases[event['name']] = (count + 1, total + event['dur'], max(longest, event['dur']))
+    report_info(f'[ PROFILE  ] {profile_file} (times include nested phases)', BLUE)
+    report_info(f'{"phase":<24}{"calls":>8}{"total ms":>12}{"mean ms":>12}{"max ms":>12}', BLUE)
+    hottest = sorted(phases.items(), key=lambda item: item[1][1], reverse=True)
+    for phase, (count, total, longest) in hottest[:PROFILE_SUMMARY_LINES]:
+        report_info(f'{phase:<24}{count:>8}{total / 1000:>12.3f}'
+                    f'{total / count / 1000:>12.3f}{longest / 1000:>12.3f}')
+    return
 
-def test_print(args):
+def report_summary(tests, rcs, args, usages=None, allocs=None):
     """
-    Test the 'print' functionality of the program.
+    Prints a per-test result table (verbose only) and a one-line summary.
 
     Args:
-        args: Additional arguments passed to the function.
+        tests (list): The names of the tests that were run.
+        rcs (list): The return code of each test, in the same order.
+        args: Command-line arguments.
+        usages (list, optional): The resource usage of each test (see record_usage).
+        allocs (list, optional): The allocation counts of each test (see record_alloc).
 
     Returns:
-        int: Return code indicating the success or failure of the test.
+        None
     """
-    if (copy_test_input_files() != 0):
-        report_failure(f'Unable to copy test input files')
-        return 1
-
-    user_cmd = 'print'
-
-    # build the command sequence into a string
-    test_cmd = f'{USER_COMMANDS[user_cmd]}\n{USER_COMMANDS["exit"]}\n'
-    input_file = f'test_input_{user_cmd}.txt'
-    with open(input_file, 'w') as f:
-        f.write(test_cmd)
-    
-    test_output_file = f'test_output_{user_cmd}.txt'
-
-    autotest_queue_file = os.path.join(DATA_DIR, AUTOTEST_MOVIE_QUEUE_UPDATE_FILE)
-
-    # run the program
-    cmd = f'{EXECUTABLE} < {input_file} > {test_output_file} 2>&1'
-    rc = execute_command(cmd, args)
-    if rc != 0:
-        return rc
-    
-    # check that the updated movie queue file does not contain the first movie
+    passed = sum(1 for rc in rcs if rc == 0)
+    color = GREEN if passed == len(rcs) else RED
+    usages = usages or [None] * len(tests)
+    allocs = allocs or [None] * len(tests)
     if args.verbose:
-        report_info(f'Checking print output')
-
-    rc = file_contains_file(test_output_file, autotest_queue_file, args=args)
-    return rc
-
-
-
+        print(f'{BLUE}[==========]{RESET}')
+        print(f'{BLUE}[ SUMMARY  ]{RESET}')
+        width = max(len(test) for test in tests)
+        for test, rc, usage, alloc in zip(tests, rcs, usages, allocs):
+            detail = ''
+            if usage:
+                detail = (f'  {format_rss(usage):>12} {usage["user"] + usage["sys"]:>8.3f}s CPU '
+                          f'{usage["minor_faults"] + usage["major_faults"]:>6} faults')
+            if alloc:
+                detail += f' {alloc["allocations"]:>8} allocs {alloc["outstanding"]:>8} B leaked'
+            if rc == 0:
+                report_info(f'[  PASSED  ] {test:<{width}}{detail}', GREEN)
+            elif rc in RC_REASONS:
+                report_info(f'[  FAILED  ] {test:<{width}}{detail} rc: {rc} ({RC_REASONS[rc]})', RED)
+            else:
+                report_info(f'[  FAILED  ] {test:<{width}}{detail} rc: {rc}', RED)
+    print(f'{color}[==========] {passed}/{len(rcs)} tests passed, '
+          f'{len(rcs) - passed} failed{RESET}')
+    measured = [usage for usage in usages if usage]
+    if measured:
+        print(f'{color}[==========] peak RSS {format_rss(max(measured, key=lambda u: u["max_rss_kb"]))}, '
+              f'CPU {sum(u["user"] + u["sys"] for u in measured):.3f}s{RESET}')
+    counted = [alloc for alloc in allocs if alloc]
+    if counted:
+        leaking = sum(1 for alloc in counted if alloc['outstanding'] > 0)
+        print(f'{RED if leaking else color}[==========] {sum(a["allocations"] for a in counted)} allocations, '
+              f'{leaking} of {len(counted)} tests left memory allocated at exit{RESET}')
+    return
 
+def combined_rc(rcs):
+    """
+    Returns the exit status for a batch of tests: 0 if every test passed,
+    otherwise the return code of the first failing test.
+    """
+    for rc in rcs:
+        if rc != 0:
+            return rc
+    return 0
 
 
 #--------------------------------------------------------------------------
@@ -836,7 +2132,7 @@ def footer(msg, rc, args):
         print(f'{BLUE}[   END    ] {msg} rc: {rc}{RESET}')
         print(f'{BLUE}[==========]{RESET}')
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbose", action="store_true", default=True, 
                         help="Enable verbose output")
@@ -848,20 +2144,73 @@ def parse_arguments():
                         help="Disable cleanup after running tests")
     parser.add_argument("--debug", action="store_true", default=False, 
                         help="Enable debug mode")
+    parser.add_argument("--savefiles", action="store_true", default=False, 
+                        help="Write test input/output files to disk (implied by --debug)")
+    parser.add_argument("--unified", action="store_true", default=False, 
+                        help="Show differences in unified rather than side-by-side format")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, 
+                        help="Time budget in seconds for each test (0 for none)")
+    parser.add_argument("--total-timeout", type=float, default=0, 
+                        help="Time budget in seconds for the whole run (0 for none)")
+    parser.add_argument("--memory-limit", type=int, default=MEMORY_LIMIT, 
+                        help="Address space limit in MB for the program under test (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=CPU_LIMIT, 
+                        help="CPU time limit in seconds for the program under test (0 for none)")
+    parser.add_argument("--output-limit", type=int, default=OUTPUT_LIMIT, 
+                        help="Bytes of output kept from each program run (0 for no limit)")
+    parser.add_argument("--alloc", action="store_true", default=False, 
+                        help="Count the allocations of the program under test (see AutoTest_Alloc.py)")
+    parser.add_argument("--result-cache", nargs='?', const=AutoTest_Cache.RESULT_CACHE_DIR, default=None, 
+                        help="Reuse results of unchanged tests from this cache directory")
+    parser.add_argument("--results-db", type=str, default=AutoTest_Results.RESULTS_DB, 
+                        help="Append the test results to this SQLite database (see AutoTest_Results.py)")
+    parser.add_argument("--no-results-db", dest="results_db", action="store_const", const=None, 
+                        help="Do not record the test results")
+    parser.add_argument("--submission", type=str, default=None, 
+                        help="Submission name recorded with the results (default: the source directory name)")
+    parser.add_argument("--json", type=str, default=None, 
+                        help="Write the test results to this JSON file")
+    parser.add_argument("--junit", type=str, default=None, 
+                        help="Write the test results to this JUnit XML file")
+    parser.add_argument("--profile", nargs='?', const=PROFILE_FILE, default=None, 
+                        help="Time the grader's phases; write a Chrome trace to this file")
     parser.add_argument("-t", "--test", nargs='+', type=str, default=None, 
                         help=f"Specify the test(s) to run from: {TEST_CASES}")
-    return parser.parse_args()
+    parser.add_argument("-j", "--jobs", type=int, default=1, 
+                        help=f"Run tests in parallel in per-test {SANDBOX_DIR} directories")
+    return parser.parse_args(argv)
 
 def test_main():
+    global PROFILING
     args = parse_arguments()
 
     if args.quiet:
         args.verbose = False
 
+    # output files are relative to where the script was started, not TEST_DIR
+    for option in ('json', 'junit', 'profile', 'results_db'):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+    PROFILING = bool(args.profile)
+
+    args.run_deadline = None
+    if args.total_timeout:
+        args.run_deadline = time.monotonic() + args.total_timeout
+    source_dir = os.getcwd()
+    if source_dir.endswith(TEST_DIR):
+        source_dir = os.path.normpath(os.path.join(source_dir, PARENT_PROJECT))
+    args.alloc_shim = None
+    if args.alloc:
+        args.alloc_shim = AutoTest_Alloc.build_shim()
+        if not args.alloc_shim:
+            report_failure(f'Unable to build {AutoTest_Alloc.SHIM_SOURCE}')
+            sys.exit(NOT_FOUND_RC)
+
     if not args.nosetup:
         # execute the setup function if it exists
         try:
-            setup(args)
+            with profile_span('setup'):
+                setup(args)
         except NameError:
             pass
 
@@ -870,23 +2219,46 @@ def test_main():
         tests = TEST_CASES
     else:
         tests = args.test
+    if args.debug:
+        report_info(f'[ PLAN     ] {len(tests)} tests, {len(plan_runs(tests))} program runs')
 
-    for test in tests:
-        banner(test, args)
-        try:
-            rc = globals()[test](args)
-        except NameError:
-            report_failure(f'Test function {test} not found.')
-            rc = 0
-        footer(test, rc, args)
+    # program runs shared by the tests of this run (see run_spec)
+    args.run_results = {}
+    if args.jobs > 1:
+        results = run_tests_parallel(tests, args)
+    else:
+        results = []
+        for test in tests:
+            run_test(test, args)
+            results.append(args.test_result)
+    rcs = [result['rc'] for result in results]
+
+    if len(tests) > 1:
+        report_summary(tests, rcs, args, [result.get('usage') for result in results],
+                       [result.get('alloc') for result in results])
+    rc = combined_rc(rcs)
+
+    if args.json:
+        write_json_results(results, rc, args.json)
+    if args.junit:
+        write_junit_results(results, args.junit)
+    if args.results_db:
+        submission = args.submission or os.path.basename(source_dir)
+        if not AutoTest_Results.record_results(args.results_db, submission, AutoTest_Results.git_commit(source_dir),
+                                               'output', results):
+            report_failure(f'Unable to record the results in {args.results_db}')
 
     if not args.nocleanup:
         # execute the cleanup function if it exists
         try:
-            cleanup(args)
+            with profile_span('cleanup'):
+                cleanup(args)
         except NameError:
             pass
 
+    if args.profile:
+        write_profile(args.profile)
+
     sys.exit(rc)
 
 def main():
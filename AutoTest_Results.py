@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Results.py
+# Description: SQLite store of every test result, and class-wide reports
+#              over it
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# AutoTest_OutputTest.py, AutoTest_GTest.py and AutoTest_Grade.py append
+# one row per test to a local SQLite database (see --results-db): the
+# submission, its commit, the test, rc, failure class, duration and
+# resource usage.  Each run of the tests is also a row of runs, so the
+# results of a push can be compared with those of the push before it.
+# The results are indexed on (test, submission, time) and (submission,
+# time), so the reports below read only the rows they need even with
+# hundreds of thousands of rows.
+#
+# Reports:
+#     ./AutoTest_Results.py failures [-t test_watch test_delete]
+#     ./AutoTest_Results.py durations [-t BSTTest.Remove] [--all-runs]
+#     ./AutoTest_Results.py regressions
+#     ./AutoTest_Results.py history alice
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import math
+import re
+import sqlite3
+import subprocess
+import time
+
+import AutoTest_Cache
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+RESULTS_DB = os.path.join(AutoTest_Cache.CACHE_DIR, 'results.sqlite')
+# seconds a writer waits for another grader process to finish its write
+BUSY_TIMEOUT = 30
+HISTORY_ROWS = 20
+NUMBER = re.compile(r'-?\d+(\.\d+)?')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    submission TEXT NOT NULL,
+    commit_id TEXT,
+    kind TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run INTEGER NOT NULL REFERENCES runs(id),
+    time REAL NOT NULL,
+    submission TEXT NOT NULL,
+    test TEXT NOT NULL,
+    rc INTEGER,
+    failure TEXT,
+    message TEXT,
+    duration REAL,
+    max_rss_kb INTEGER,
+    user_seconds REAL,
+    sys_seconds REAL,
+    minor_faults INTEGER,
+    major_faults INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_submission ON runs(submission, kind, commit_id);
+CREATE INDEX IF NOT EXISTS results_test ON results(test, submission, time);
+CREATE INDEX IF NOT EXISTS results_submission ON results(submission, time);
+CREATE INDEX IF NOT EXISTS results_run ON results(run, test);
+"""
+
+
+def connect(db_file):
+    """
+    Opens (and if needed creates) the results database.  WAL mode lets the
+    graders of concurrent submissions append while a report reads.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+    db = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(SCHEMA)
+    return db
+
+
+def git_commit(directory):
+    """
+    Returns the commit checked out in directory, or None if it is not a
+    git checkout.
+    """
+    try:
+        proc = subprocess.run(['git', '-C', directory, 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True)
+    except OSError:
+        return None
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+def record_results(db_file, submission, commit, kind, records):
+    """
+    Appends one run of tests to the results database.
+
+    Args:
+        db_file (str): The results database.
+        submission (str): The submission the tests were run on.
+        commit (str): The commit of the submission, or None.
+        kind (str): 'output' or 'gtest'.
+        records (list): Result records (see AutoTest_OutputTest.new_result).
+
+    Returns:
+        bool: False if the database could not be written; the results of
+        the run are not affected.
+    """
+    now = time.time()
+    rows = []
+    for record in records:
+        usage = record.get('usage') or {}
+        rows.append((record['name'], record['rc'], record['failure'], record['message'],
+                     record['duration'], usage.get('max_rss_kb'), usage.get('user'), usage.get('sys'),
+                     usage.get('minor_faults'), usage.get('major_faults')))
+    try:
+        db = connect(db_file)
+        try:
+            with db:
+                run = db.execute('INSERT INTO runs (time, submission, commit_id, kind) VALUES (?, ?, ?, ?)',
+                                 (now, submission, commit, kind)).lastrowid
+                db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               [(run, now, submission) + row for row in rows])
+        finally:
+            db.close()
+    except (OSError, sqlite3.Error):
+        return False
+    return True
+
+
+#--------------------------------------------------------------------------
+# Reports
+#--------------------------------------------------------------------------
+def test_filter(args, latest=True):
+    """
+    Returns the WHERE clause and parameters selecting args.tests and, if
+    latest and not args.all_runs, only the latest run of each submission.
+    """
+    clauses = []
+    params = []
+    if args.tests:
+        clauses.append(f'test IN ({", ".join("?" * len(args.tests))})')
+        params += args.tests
+    if latest and not args.all_runs:
+        clauses.append('run IN (SELECT MAX(id) FROM runs GROUP BY submission, kind)')
+    return (f'WHERE {" AND ".join(clauses)}' if clauses else ''), params
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at fraction (0-1) of a sorted list (nearest rank:
+    the smallest value with at least that fraction of the list at or below it).
+    """
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def print_table(header, rows):
+    """
+    Prints rows under a header, numbers right-aligned and None as '-'.
+    """
+    cells = [[('-' if value is None else f'{value:.4f}' if isinstance(value, float) else str(value))
+              for value in row] for row in rows]
+    numeric = [all(NUMBER.fullmatch(row[index]) or row[index] == '-' for row in cells)
+               for index in range(len(header))]
+    widths = [max(len(value) for value in column) for column in zip(header, *cells)]
+    for row in [header] + cells:
+        print('  '.join(f'{value:>{width}}' if right else f'{value:<{width}}'
+                        for value, width, right in zip(row, widths, numeric)).rstrip())
+    return
+
+
+def report_failures(db, args):
+    """
+    Prints the runs, failures and most common failure class of each test,
+    most failures first.
+    """
+    where, params = test_filter(args)
+    counts = db.execute(f'SELECT test, COUNT(*), SUM(rc != 0) FROM results {where} '
+                        f'GROUP BY test ORDER BY 3 DESC, test', params).fetchall()
+    where = f'{where} AND rc != 0' if where else 'WHERE rc != 0'
+    classes = {}
+    for test, failure, count in db.execute(f'SELECT test, failure, COUNT(*) FROM results {where} '
+                                           f'GROUP BY test, failure ORDER BY 3', params):
+        classes[test] = f'{failure} ({count})'
+    print_table(['test', 'runs', 'failed', 'fail %', 'most common failure'],
+                [[test, runs, failed, f'{100 * failed / runs:.1f}', classes.get(test, '-')]
+                 for test, runs, failed in counts])
+    return
+
+
+def report_durations(db, args):
+    """
+    Prints the number, mean, median, 95th percentile and maximum of the
+    durations of each test.
+    """
+    where, params = test_filter(args)
+    rows = []
+    test = None
+    durations = []
+    query = f'SELECT test, duration FROM results {where} ORDER BY test, duration'
+    for name, duration in db.execute(query, params).fetchall() + [(None, None)]:
+        if name != test and durations:
+            rows.append([test, len(durations), sum(durations) / len(durations),
+                         percentile(durations, 0.5), percentile(durations, 0.95), durations[-1]])
+            durations = []
+        test = name
+        if duration is not None:
+            durations.append(duration)
+    print_table(['test', 'runs', 'mean s', 'median s', 'p95 s', 'max s'], rows)
+    return
+
+
+def report_regressions(db, args):
+    """
+    Prints the tests that passed at the previous graded commit of a
+    submission and fail at its latest one.
+    """
+    query = """
+        WITH latest AS (SELECT submission, kind, commit_id, MAX(id) AS run
+                        FROM runs GROUP BY submission, kind, commit_id),
+             ranked AS (SELECT *, ROW_NUMBER() OVER (PARTITION BY submission, kind
+                                                     ORDER BY run DESC) AS n FROM latest),
+             pairs AS (SELECT submission,
+                              MAX(CASE WHEN n = 2 THEN commit_id END) AS before_commit,
+                              MAX(CASE WHEN n = 1 THEN commit_id END) AS now_commit,
+                              MAX(CASE WHEN n = 2 THEN run END) AS before_run,
+                              MAX(CASE WHEN n = 1 THEN run END) AS now_run
+                       FROM ranked WHERE n <= 2 GROUP BY submission, kind)
+        SELECT pairs.submission, SUBSTR(before_commit, 1, 12), SUBSTR(now_commit, 1, 12),
+               result.test, result.rc, result.failure
+        FROM pairs
+        JOIN results result ON result.run = pairs.now_run
+        JOIN results passed ON passed.run = pairs.before_run AND passed.test = result.test
+        WHERE result.rc != 0 AND passed.rc = 0
+        ORDER BY pairs.submission, result.test
+    """
+    rows = db.execute(query).fetchall()
+    if args.tests:
+        rows = [row for row in rows if row[3] in args.tests]
+    if not rows:
+        print('No regressions')
+        return
+    print_table(['submission', 'before', 'now', 'test', 'rc', 'failure'], rows)
+    return
+
+
+def report_history(db, args):
+    """
+    Prints the latest results of one submission, newest first.
+    """
+    where, params = test_filter(args, latest=False)
+    where = f'{where} AND results.submission = ?' if where else 'WHERE results.submission = ?'
+    query = f"""
+        SELECT datetime(results.time, 'unixepoch', 'localtime'), SUBSTR(commit_id, 1, 12), test, rc,
+               failure, duration, max_rss_kb
+        FROM results JOIN runs ON runs.id = results.run {where}
+        ORDER BY results.time DESC, test LIMIT ?
+    """
+    rows = db.execute(query, params + [args.submission, args.limit]).fetchall()
+    print_table(['time', 'commit', 'test', 'rc', 'failure', 'duration s', 'peak RSS KB'], rows)
+    return
+
+
+REPORTS = {'failures': report_failures,
+           'durations': report_durations,
+           'regressions': report_regressions,
+           'history': report_history}
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Class-wide reports over the recorded test results')
+    parser.add_argument("report", choices=list(REPORTS),
+                        help="failures: fail rate per test; durations: duration statistics per test; "
+                             "regressions: tests that failed since the previous commit; "
+                             "history: the results of one submission")
+    parser.add_argument("submission", nargs='?', default=None,
+                        help="Submission for the history report")
+    parser.add_argument("-t", "--tests", nargs='+', type=str, default=None,
+                        help="Only these tests, e.g. test_watch BSTTest.Remove")
+    parser.add_argument("--all-runs", action="store_true", default=False,
+                        help="Report on every recorded run, not just the latest run of each submission")
+    parser.add_argument("-n", "--limit", type=int, default=HISTORY_ROWS,
+                        help="Rows of the history report")
+    parser.add_argument("--db", type=str, default=RESULTS_DB,
+                        help="The results database")
+    return parser.parse_args(argv)
+
+
+def results_main():
+    args = parse_arguments()
+    if args.report == 'history' and not args.submission:
+        print('The history report needs a submission')
+        sys.exit(2)
+    if not os.path.exists(args.db):
+        print(f'No results database: {args.db}')
+        sys.exit(1)
+    db = connect(args.db)
+    REPORTS[args.report](db, args)
+    db.close()
+    sys.exit(0)
+
+def main():
+    results_main()
+
+if __name__ == "__main__":
+    main()
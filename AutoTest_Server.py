@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Server.py
+# Description: Long-lived grading server for BST_Project checkouts
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# Every AutoTest_Grade.py run starts Python, imports the scripts, checks
+# the googletest artifact, parses the gtest list and hashes the data files
+# again.  This server does that once and then grades checkouts on request
+# over a Unix socket, on a pool of worker processes that stay alive between
+# jobs, so their memoized file hashes, expected files (read from this
+# AutoTest directory rather than from each staged copy) and the imported
+# cpplint stay warm.  The grading itself is AutoTest_Grade.grade_submission,
+# and its log is streamed back to the client while the job runs.
+#
+# Protocol: the client sends one JSON line, e.g.
+#     {"checkout": "/path/to/student", "tests": [...], "gtests": [...], "nostyle": false}
+# and receives JSON lines {"event": "log", "text": ...} while the job runs,
+# then {"event": "result", "result": {...}, "grade": ..., "passed": ...} or
+# {"event": "error", "message": ...}.  "grade" is the grade line
+# AutoTest_Grade.py prints and "passed" is true if the checkout built and
+# passed every test.
+#
+# Start it once, then grade with AutoTest_Client.py:
+#     ./BST_Project_AutoTest/AutoTest_Server.py -j 8 &
+#     ./BST_Project_AutoTest/AutoTest_Client.py
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import concurrent.futures
+import glob
+import json
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+import AutoTest_OutputTest as ot
+import AutoTest_Build as build
+import AutoTest_Cache
+import AutoTest_GTest as gtest_runner
+import AutoTest_Grade as grade
+import AutoTest_Results
+import AutoTest_Style as style
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.path.join(AutoTest_Cache.CACHE_DIR, 'grader.sock')
+WORK_DIR = os.path.join(AutoTest_Cache.CACHE_DIR, 'grading')
+# seconds between reads of a running job's log
+POLL_INTERVAL = 0.1
+
+
+def warm_worker():
+    """
+    Initializes a worker process: the output tests read their data and
+    expected files from this AutoTest directory (the same files every
+    staged copy has), so they are read and hashed once per worker, and
+    cpplint is imported once.  Output is line buffered so the log of a
+    running job can be streamed.
+    """
+    ot.DATA_DIR = AUTOTEST_DIR
+    sys.stdout.reconfigure(line_buffering=True)
+    style.import_cpplint()
+    AutoTest_Cache.data_files_hash(ot.DATA_DIR)
+    for file in glob.glob(os.path.join(ot.DATA_DIR, 'AutoTest_movie_queue_updated*.txt')):
+        ot.read_expected_file(file)
+    return
+
+
+def job_arguments(request, args):
+    """
+    Returns the grading arguments for one request, or raises ValueError if
+    the request is not valid.
+    """
+    if not isinstance(request, dict):
+        raise ValueError('The request must be a JSON object')
+    checkout = request.get('checkout')
+    if (not isinstance(checkout, str) or not checkout
+            or not ot.file_exists(os.path.join(checkout, grade.SOURCE_FILES[0]))):
+        raise ValueError(f'No {grade.SOURCE_FILES[0]} in checkout: {checkout}')
+    job_args = argparse.Namespace(**vars(args))
+    job_args.tests = request.get('tests') or ot.TEST_CASES
+    job_args.gtests = request.get('gtests') or args.gtests
+    job_args.nostyle = bool(request.get('nostyle', False))
+    for names in (job_args.tests, job_args.gtests):
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError('tests and gtests must be lists of names')
+    # only tests: never setup, cleanup, main or anything else in the module
+    unknown = [test for test in job_args.tests
+               if test not in ot.TEST_CASES and ot.find_test(test) is None]
+    unknown += [gtest for gtest in job_args.gtests if gtest not in args.gtests]
+    if unknown:
+        raise ValueError(f'Unknown tests: {" ".join(unknown)}')
+    return os.path.abspath(checkout), job_args
+
+
+class GradingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Accepts one grading job per connection and runs it on the warm pool.
+    Jobs for the same checkout name share a work tree, so they are run one
+    at a time.
+    """
+    daemon_threads = True
+
+    def __init__(self, path, args):
+        super().__init__(path, GradingHandler)
+        self.args = args
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs, initializer=warm_worker)
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def checkout_lock(self, name):
+        with self.locks_lock:
+            return self.locks.setdefault(name, threading.Lock())
+
+
+class GradingHandler(socketserver.StreamRequestHandler):
+
+    def send(self, event, **fields):
+        self.wfile.write((json.dumps(dict(fields, event=event)) + '\n').encode())
+        self.wfile.flush()
+        return
+
+    def handle(self):
+        try:
+            self.grade()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client went away; its job (if any) was still run to the end
+            pass
+        return
+
+    def grade(self):
+        server = self.server
+        line = self.rfile.readline()
+        if not line.strip():
+            return
+        try:
+            checkout, job_args = job_arguments(json.loads(line), server.args)
+        except ValueError as e:
+            self.send('error', message=str(e))
+            return
+
+        name = os.path.basename(checkout)
+        log_file = os.path.join(job_args.workdir, name, grade.GRADE_LOG_FILE)
+        with server.checkout_lock(name):
+            start = time.monotonic()
+            ot.file_remove(log_file)
+            future = server.pool.submit(grade.grade_submission, checkout, job_args)
+            try:
+                self.stream_log(log_file, future)
+            finally:
+                # the next job for this checkout must not start while this one runs
+                concurrent.futures.wait([future])
+        try:
+            result = future.result()
+        except Exception as e:
+            self.send('error', message=f'{type(e).__name__}: {e}')
+            return
+        if server.args.verbose:
+            passed, total = grade.count_passed(result)
+            ot.report_info(f'[ GRADED   ] {name}: {passed}/{total} tests passed '
+                           f'({time.monotonic() - start:.2f} s)')
+        # the client prints the grade as sent, so it need not import the grader
+        message, color = grade.grade_line(result)
+        passed, total = grade.count_passed(result)
+        self.send('result', result=result, grade=f'{color}{message}{ot.RESET}\n',
+                  passed=result['build'] == 0 and passed == total)
+        return
+
+    def stream_log(self, log_file, future):
+        """
+        Sends what the job writes to its log until the job is done.
+        """
+        position = 0
+        while True:
+            done = future.done()
+            if ot.file_exists(log_file):
+                with open(log_file, 'rb') as f:
+                    f.seek(position)
+                    text = f.read()
+                    position += len(text)
+                if text:
+                    self.send('log', text=text.decode(errors='replace'))
+            if done:
+                return
+            time.sleep(POLL_INTERVAL)
+
+
+def remove_stale_socket(path):
+    """
+    Removes a socket file left by a server that is no longer running.
+
+    Returns:
+        bool: False if a server is still listening on path.
+    """
+    if not os.path.exists(path):
+        return True
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            return False
+        except OSError:
+            pass
+    os.remove(path)
+    return True
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Grade checkouts on request with warm caches')
+    parser.add_argument("--socket", type=str, default=SOCKET_PATH,
+                        help="Unix socket to listen on")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of checkouts graded concurrently")
+    parser.add_argument("-w", "--workdir", type=str, default=WORK_DIR,
+                        help="Directory for the per-checkout work trees")
+    parser.add_argument("--cache", type=str, default=build.CACHE_DIR,
+                        help="Shared cache directory for googletest and built targets")
+    parser.add_argument("--timeout", type=float, default=ot.TIMEOUT,
+                        help="Time budget in seconds for each test (0 for none)")
+    parser.add_argument("--result-cache", type=str, default=AutoTest_Cache.RESULT_CACHE_DIR,
+                        help="Directory of cached test results")
+    parser.add_argument("--no-result-cache", dest="result_cache", action="store_const", const=None,
+                        help="Run every test even if a cached result exists")
+    parser.add_argument("--results-db", type=str, default=AutoTest_Results.RESULTS_DB,
+                        help="Append the test results to this SQLite database (see AutoTest_Results.py)")
+    parser.add_argument("--no-results-db", dest="results_db", action="store_const", const=None,
+                        help="Do not record the test results")
+    parser.add_argument("--memory-limit", type=int, default=ot.MEMORY_LIMIT,
+                        help="Address space limit in MB for each student program (0 for none)")
+    parser.add_argument("--cpu-limit", type=int, default=ot.CPU_LIMIT,
+                        help="CPU time limit in seconds for each student program (0 for none)")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Print a line for each graded job")
+    return parser.parse_args(argv)
+
+
+def server_main():
+    args = parse_arguments()
+    args.workdir = os.path.abspath(args.workdir)
+    args.results_db = args.results_db and os.path.abspath(args.results_db)
+    args.gtests = gtest_runner.source_tests()
+    args.gtest_prefix = build.build_gtest(args.cache, args)
+    os.makedirs(args.workdir, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(args.socket)), exist_ok=True)
+    if not remove_stale_socket(args.socket):
+        ot.report_failure(f'A grading server is already listening on {args.socket}')
+        sys.exit(1)
+
+    with GradingServer(args.socket, args) as server:
+        # start (and warm) the workers before any handler thread exists
+        server.pool.submit(os.getpid).result()
+        ot.report_info(f'[ SERVER   ] Grading on {args.socket} with {args.jobs} workers', ot.GREEN)
+        # stop the same way on kill as on Ctrl-C
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.pool.shutdown(cancel_futures=True)
+            ot.file_remove(args.socket)
+    sys.exit(0)
+
+def main():
+    server_main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+#--------------------------------------------------------------------------
+# File: AutoTest_Style.py
+# Description: Python script to check the coding style of the BST_Project
+#              sources with cpplint
+# Programmer: Michelle Talley
+# Copyright 2024 Michelle Talley University of Central Arkansas
+#--------------------------------------------------------------------------
+# AutoTest_Style.sh runs pip install cpplint on every invocation and lints
+# the files one after another.  This script imports the installed cpplint
+# instead (no network; it falls back to AutoTest_Style.sh if cpplint is not
+# installed), takes the filters from cpplint.cfg, lints the files
+# on a process pool and caches each file's result under its content hash
+# and the filter set, so an unchanged header, or a starter file that is the
+# same in every submission, is only linted once.
+#
+# Like AutoTest_Style.sh, run it with the directory of the sources:
+#     ./AutoTest_Style.py . main.cpp BST.h
+#--------------------------------------------------------------------------
+import sys
+import os
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import subprocess
+
+import AutoTest_OutputTest as ot
+import AutoTest_Cache
+
+
+#--------------------------------------------------------------------------
+# Global variables - modify as needed
+#--------------------------------------------------------------------------
+AUTOTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(AUTOTEST_DIR, 'cpplint.cfg')
+# run instead when cpplint is not installed; it pip installs cpplint first
+STYLE_SCRIPT = os.path.join(AUTOTEST_DIR, 'AutoTest_Style.sh')
+# lint_file sets cpplint's private _cpplint_state, _SetFilters and
+# _line_length, which are not a stable API: this is the tested version
+CPPLINT_VERSION = '2.0.2'
+SOURCE_FILES = ['main.cpp', 'BST.h']
+STYLE_CACHE_DIR = os.path.join(AutoTest_Cache.CACHE_DIR, 'style')
+STYLE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# cpplint's default line length, used if cpplint.cfg does not set one
+LINE_LENGTH = 80
+# stands for the linted path in cached messages, so identical files in
+# different submissions share one entry
+FILE_PLACEHOLDER = '<file>'
+
+
+def import_cpplint():
+    """
+    Returns the cpplint module, or None if it is not installed.
+    """
+    try:
+        import cpplint
+    except ImportError:
+        return None
+    return cpplint
+
+
+def read_config(config_file=CONFIG_FILE):
+    """
+    Reads the filter and linelength settings of a cpplint.cfg; like
+    cpplint, every filter= line adds to the filters.
+
+    Returns:
+        tuple: (list of filters, line length)
+    """
+    filters = []
+    linelength = LINE_LENGTH
+    with open(config_file, 'r') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            name, _, value = line.partition('=')
+            if name.strip() == 'filter':
+                filters += [filt.strip() for filt in value.split(',') if filt.strip()]
+            elif name.strip() == 'linelength':
+                linelength = int(value)
+    return filters, linelength
+
+
+def lint_file(path, filters, linelength):
+    """
+    Lints one file with cpplint in this process.
+
+    Returns:
+        tuple: (number of errors, cpplint's messages with the path replaced
+        by FILE_PLACEHOLDER)
+    """
+    cpplint = import_cpplint()
+    cpplint._cpplint_state.ResetErrorCounts()
+    cpplint._SetFilters(','.join(filters))
+    cpplint._line_length = linelength
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages), contextlib.redirect_stderr(messages):
+        cpplint.ProcessFile(path, 1)
+    lines = [line.replace(path, FILE_PLACEHOLDER) for line in messages.getvalue().splitlines()
+             if line and not line.startswith('Done processing')]
+    return cpplint._cpplint_state.error_count, lines
+
+
+def style_key(cpplint, path, filters, linelength):
+    """
+    Returns the cache key of a file's lint result: cpplint's version, the
+    file name (cpplint checks .h and .cpp differently), its content hash,
+    the filter set and the line length.
+    """
+    return AutoTest_Cache.cache_key('cpplint', cpplint.__VERSION__, os.path.basename(path),
+                                    AutoTest_Cache.file_hash(path), ','.join(sorted(filters)), linelength)
+
+
+def check_style(directory, files, args):
+    """
+    Lints files in directory, serving unchanged files from the style cache
+    and linting the others on args.jobs processes.
+
+    Returns:
+        int: 0 if every file is clean, 1 if there are errors or a file is
+        missing, NOT_FOUND_RC if cpplint is not installed.
+    """
+    ot.report_info('[==========]', ot.GREEN)
+    ot.report_info(f'[ STYLE    ] Checking {" ".join(files)}', ot.GREEN)
+    ot.report_info('[----------]', ot.GREEN)
+
+    cpplint = import_cpplint()
+    if cpplint is None:
+        ot.report_failure(f'cpplint is not installed (pip install cpplint=={CPPLINT_VERSION})')
+        return ot.NOT_FOUND_RC
+    filters, linelength = read_config(args.config)
+
+    results = {}
+    keys = {}
+    for file in files:
+        path = os.path.join(directory, file)
+        if not ot.file_exists(path):
+            results[file] = (1, [f'{FILE_PLACEHOLDER}: file not found'])
+            continue
+        keys[file] = style_key(cpplint, path, filters, linelength) if args.style_cache else None
+        cached = AutoTest_Cache.cache_get(args.style_cache, keys[file]) if keys[file] else None
+        if cached:
+            results[file] = (cached['errors'], cached['messages'])
+            if args.verbose:
+                ot.report_info(f'[ CACHED   ] {file}')
+
+    pending = [file for file in files if file not in results]
+    if args.jobs > 1 and len(pending) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(args.jobs, len(pending))) as pool:
+            futures = {file: pool.submit(lint_file, os.path.join(directory, file), filters, linelength)
+                       for file in pending}
+            for file in pending:
+                results[file] = futures[file].result()
+    else:
+        for file in pending:
+            results[file] = lint_file(os.path.join(directory, file), filters, linelength)
+    for file in pending:
+        if keys[file]:
+            errors, messages = results[file]
+            AutoTest_Cache.cache_put(args.style_cache, keys[file], {'errors': errors, 'messages': messages},
+                                     STYLE_CACHE_MAX_BYTES)
+
+    total = 0
+    for file in files:
+        errors, messages = results[file]
+        total += errors
+        for message in messages:
+            print(message.replace(FILE_PLACEHOLDER, os.path.join(directory, file)))
+    if total:
+        print(f'Total errors found: {total}')
+        ot.report_info('[==========]', ot.RED)
+        ot.report_info('[  FAILED  ] Coding style checks.', ot.RED)
+        ot.report_info('[==========]', ot.RED)
+        return 1
+    ot.report_info('[==========]', ot.GREEN)
+    ot.report_info('[  PASSED  ] Coding style checks', ot.GREEN)
+    ot.report_info('[==========]', ot.GREEN)
+    return 0
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Check the coding style of the sources with cpplint')
+    parser.add_argument("directory", type=str, nargs='?', default='.',
+                        help="Directory containing the source files")
+    parser.add_argument("files", nargs='*', default=SOURCE_FILES,
+                        help="Source files to check (default: main.cpp BST.h)")
+    parser.add_argument("--config", type=str, default=CONFIG_FILE,
+                        help="cpplint.cfg with the filter (and linelength) settings")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of files linted concurrently")
+    parser.add_argument("--style-cache", type=str, default=STYLE_CACHE_DIR,
+                        help="Directory of cached lint results")
+    parser.add_argument("--no-style-cache", dest="style_cache", action="store_const", const=None,
+                        help="Lint every file even if a cached result exists")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Verbose output")
+    return parser.parse_args(argv)
+
+
+def style_main():
+    args = parse_arguments()
+    if import_cpplint() is None:
+        ot.report_info(f'cpplint is not installed, running {os.path.basename(STYLE_SCRIPT)}', ot.BLUE)
+        sys.exit(subprocess.call(['bash', STYLE_SCRIPT, args.directory] + args.files))
+    sys.exit(check_style(args.directory, args.files, args))
+
+def main():
+    style_main()
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,10 @@ cd $repo
 echo
 echo "#################### START: AutoTest Results #####################"
 echo "--- Checking code format (cpplint) ---"
-./AutoTest_Style.sh $repo main.cpp BST.h
+# AutoTest_Style.py uses the installed cpplint with the filters in
+# cpplint.cfg and caches results; without cpplint it runs AutoTest_Style.sh,
+# which pip installs cpplint first
+./AutoTest_Style.py . main.cpp BST.h
 echo
 echo "--- Checking main output (diff) ---"
 cd build
@@ -22,31 +25,18 @@ echo
 echo "--- Test user commands individually ---"
 # AutoTest_OutputTest.py assumes starting in the source directory
 cd ../..
-./$repo/AutoTest_OutputTest.py -t test_exit
-./$repo/AutoTest_OutputTest.py -t test_search 
-./$repo/AutoTest_OutputTest.py -t test_search_not_found
-./$repo/AutoTest_OutputTest.py -t test_add
-./$repo/AutoTest_OutputTest.py -t test_add_already_present
-./$repo/AutoTest_OutputTest.py -t test_watch
-./$repo/AutoTest_OutputTest.py -t test_delete
-./$repo/AutoTest_OutputTest.py -t test_delete_not_found
-./$repo/AutoTest_OutputTest.py -t test_print
+# one invocation runs every test in TEST_CASES and prints a summary table
+./$repo/AutoTest_OutputTest.py
 echo
 # GitHub Classroom auto-grading runs the following commands from the current
 # directory of the project being tested.  To similate that here, we need to
 # change to the project directory before running the tests.
 #
-echo "--- Unit testing (single test at a time) ---"
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.Empty
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.Search
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.SearchNotFound
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.Insert
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.Remove
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.Inorder
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.Preorder
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.Postorder
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.RemoveException
-./BST_Project_AutoTest/AutoTest_gtest.sh BSTTest.InsertException
+echo "--- Unit testing (sharded, crashes isolated to single tests) ---"
+# AutoTest_GTest.py runs one process per shard instead of one per test, and
+# re-runs only the tests a crash kept from reporting; AutoTest_gtest.sh
+# <test> still runs a single test, e.g. for an autograding.json step
+./BST_Project_AutoTest/AutoTest_GTest.py -v
 
 echo
 echo "#################### END: AutoTest Results   #####################"
@@ -0,0 +1,175 @@
+/**
+* ---------------------------------------------------------------------
+* @copyright
+* Copyright 2024 Michelle Talley University of Central Arkansas
+*
+* @author: Michelle Talley
+* @course: Data Structures (CSCI 2320)
+*
+* @file AutoTest_alloc.c
+* @brief Allocation-counting shim for the student programs (LD_PRELOAD).
+-----------------------------------------------------------------------
+*/
+
+/*
+ * Counts the calls to the malloc family (operator new and delete allocate
+ * through malloc and free) and the bytes they hand out, measured as
+ * malloc_usable_size so a free can be matched to its allocation.  Counting
+ * starts when main is entered, so the allocations of the C++ runtime
+ * before main (e.g. the exception handling pool, which is never freed)
+ * are not counted.  At exit the counts are written to the file named by
+ * $AUTOTEST_ALLOC_FILE; a program that crashes writes nothing.
+ *
+ * Built and loaded by AutoTest_Alloc.py:
+ *     cc -shared -fPIC -O2 -o AutoTest_alloc.so AutoTest_alloc.c -ldl
+ */
+#define _GNU_SOURCE
+#include <dlfcn.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <malloc.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+
+extern void *__libc_malloc(size_t size);
+extern void *__libc_calloc(size_t count, size_t size);
+extern void *__libc_realloc(void *ptr, size_t size);
+extern void *__libc_memalign(size_t alignment, size_t size);
+extern void *__libc_valloc(size_t size);
+extern void *__libc_pvalloc(size_t size);
+extern void __libc_free(void *ptr);
+extern void __libc_freeres(void);
+
+static int counting;
+static unsigned long long allocations, frees, allocated_bytes, freed_bytes;
+
+static void count_allocation(void *ptr)
+{
+    if (ptr && __atomic_load_n(&counting, __ATOMIC_RELAXED)) {
+        __atomic_fetch_add(&allocations, 1, __ATOMIC_RELAXED);
+        __atomic_fetch_add(&allocated_bytes, malloc_usable_size(ptr), __ATOMIC_RELAXED);
+    }
+}
+
+static void count_free(void *ptr)
+{
+    if (ptr && __atomic_load_n(&counting, __ATOMIC_RELAXED)) {
+        __atomic_fetch_add(&frees, 1, __ATOMIC_RELAXED);
+        __atomic_fetch_add(&freed_bytes, malloc_usable_size(ptr), __ATOMIC_RELAXED);
+    }
+}
+
+void *malloc(size_t size)
+{
+    void *ptr = __libc_malloc(size);
+    count_allocation(ptr);
+    return ptr;
+}
+
+void *calloc(size_t count, size_t size)
+{
+    void *ptr = __libc_calloc(count, size);
+    count_allocation(ptr);
+    return ptr;
+}
+
+void *realloc(void *old, size_t size)
+{
+    // counted as a free of the old block and an allocation of the new one
+    size_t old_size = old ? malloc_usable_size(old) : 0;
+    void *ptr = __libc_realloc(old, size);
+    if (old && (ptr || size == 0) && __atomic_load_n(&counting, __ATOMIC_RELAXED)) {
+        __atomic_fetch_add(&frees, 1, __ATOMIC_RELAXED);
+        __atomic_fetch_add(&freed_bytes, old_size, __ATOMIC_RELAXED);
+    }
+    count_allocation(ptr);
+    return ptr;
+}
+
+void *memalign(size_t alignment, size_t size)
+{
+    void *ptr = __libc_memalign(alignment, size);
+    count_allocation(ptr);
+    return ptr;
+}
+
+void *aligned_alloc(size_t alignment, size_t size)
+{
+    return memalign(alignment, size);
+}
+
+int posix_memalign(void **result, size_t alignment, size_t size)
+{
+    if (alignment % sizeof(void *) != 0 || (alignment & (alignment - 1)) != 0)
+        return EINVAL;
+    void *ptr = memalign(alignment, size);
+    if (!ptr)
+        return ENOMEM;
+    *result = ptr;
+    return 0;
+}
+
+void *valloc(size_t size)
+{
+    void *ptr = __libc_valloc(size);
+    count_allocation(ptr);
+    return ptr;
+}
+
+void *pvalloc(size_t size)
+{
+    void *ptr = __libc_pvalloc(size);
+    count_allocation(ptr);
+    return ptr;
+}
+
+void free(void *ptr)
+{
+    count_free(ptr);
+    __libc_free(ptr);
+}
+
+// writes the counts without allocating
+static void write_counts(void)
+{
+    const char *file = getenv("AUTOTEST_ALLOC_FILE");
+    if (!file)
+        return;
+    // flush and free the C library's own buffers (stdin, stdout, ...), as
+    // valgrind does, so they do not count as outstanding
+    __libc_freeres();
+    __atomic_store_n(&counting, 0, __ATOMIC_RELAXED);
+    char text[256];
+    int length = snprintf(text, sizeof(text), "allocations %llu\nfrees %llu\nbytes %llu\noutstanding %lld\n",
+                          allocations, frees, allocated_bytes,
+                          (long long)(allocated_bytes - freed_bytes));
+    int fd = open(file, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+    if (fd < 0)
+        return;
+    if (write(fd, text, length) < 0) {
+        // nothing to report to
+    }
+    close(fd);
+}
+
+static int (*program_main)(int, char **, char **);
+
+static int counting_main(int argc, char **argv, char **envp)
+{
+    __atomic_store_n(&counting, 1, __ATOMIC_RELAXED);
+    return program_main(argc, argv, envp);
+}
+
+// called by the program's startup code: counting starts with main
+int __libc_start_main(int (*main)(int, char **, char **), int argc, char **argv,
+                      void (*init)(void), void (*fini)(void), void (*rtld_fini)(void), void *stack_end)
+{
+    int (*start_main)(int (*)(int, char **, char **), int, char **,
+                      void (*)(void), void (*)(void), void (*)(void), void *);
+    *(void **)&start_main = dlsym(RTLD_NEXT, "__libc_start_main");
+    program_main = main;
+    // after the program's own exit handlers (static destructors)
+    atexit(write_counts);
+    return start_main(counting_main, argc, argv, init, fini, rtld_fini, stack_end);
+}
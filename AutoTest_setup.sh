@@ -41,7 +41,12 @@ printf "${green}[----------]${reset}\n"
 if [ -d "build" ]; then
     rm -rf build
 fi
-cmake -S . -B build
+# AUTOTEST_GTEST_ROOT may name a prebuilt googletest (see AutoTest_Build.py)
+if [ -n "$AUTOTEST_GTEST_ROOT" ]; then
+    cmake -S . -B build -DAUTOTEST_GTEST_ROOT="$AUTOTEST_GTEST_ROOT"
+else
+    cmake -S . -B build
+fi
 cmake --build build
 rc=$?
 if [ $rc -ne 0 ]; then